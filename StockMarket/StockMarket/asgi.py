@@ -0,0 +1,18 @@
+"""
+ASGI config for StockMarket project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server such as uvicorn to run the async read endpoints
+(stocks/async_api.py) without a worker per open connection.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'StockMarket.settings')
+
+application = get_asgi_application()
@@ -79,6 +79,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'StockMarket.wsgi.application'
+ASGI_APPLICATION = 'StockMarket.asgi.application'
 
 
 # Database
@@ -102,6 +103,26 @@ DATABASES = {
     }
 }
 
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Market data responses are cached in process memory ('default'). The data
+# generation counter that versions them (see stocks/cache.py) lives in a file
+# cache so that import_all_csv, running as a separate process, can invalidate
+# every server process at once.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'stockmarket',
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+    'market_data': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'market_data',
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
 
@@ -157,7 +157,7 @@ function Portfolio() {
     setSearchQuery((prev) => ({ ...prev, [portfolioId]: query }));
 
     if (query.length > 1) {
-      fetch(`http://34.238.115.102:8000/api/stocks/?search=${query}`, {
+      fetch(`http://34.238.115.102:8000/api/stocks/typeahead/?q=${encodeURIComponent(query)}`, {
         method: 'GET',
         headers: {
           Authorization: `Token ${localStorage.getItem('token')}`,
@@ -199,7 +199,15 @@ function Portfolio() {
     setFormValues((prev) => ({ ...prev, [name]: value }));
   };
 
-  // Submit to /api/portfolios/{portfolioId}/{stockId}/ for adding a stock
+  // Replace the holdings of one portfolio in local state, so mutations don't
+  // need to re-fetch every portfolio.
+  const updateHoldings = (portfolioId, update) => {
+    setPortfolios((prev) =>
+      prev.map((p) => (p.id === portfolioId ? { ...p, stocks: update(p.stocks || []) } : p))
+    );
+  };
+
+  // Submit to /api/portfolios/{portfolioId}/holdings/{stockId}/ for adding a stock
   const handleSubmitAddStock = () => {
     const { portfolioId, stockId } = addingStock;
     const payload = {
@@ -207,8 +215,8 @@ function Portfolio() {
       shares: parseInt(formValues.shares),
     };
 
-    fetch(`http://34.238.115.102:8000/api/portfolios/${portfolioId}/${stockId}/`, {
-      method: 'POST',
+    fetch(`http://34.238.115.102:8000/api/portfolios/${portfolioId}/holdings/${stockId}/`, {
+      method: 'PUT',
       headers: {
         'Content-Type': 'application/json',
         Authorization: `Token ${localStorage.getItem('token')}`,
@@ -222,11 +230,15 @@ function Portfolio() {
         }
         return res.json();
       })
-      .then(() => {
+      .then((holding) => {
         alert('Stock added to portfolio!');
         setAddingStock(null);
         setFormValues({ buy_price: '', shares: '' });
-        fetchPortfolios();
+        updateHoldings(portfolioId, (stocks) =>
+          stocks.some((s) => s.id === holding.id)
+            ? stocks.map((s) => (s.id === holding.id ? holding : s))
+            : [...stocks, holding]
+        );
       })
       .catch((err) => alert(err.message));
   };
@@ -234,8 +246,8 @@ function Portfolio() {
   // ------------------------------------------------------------
   // 6) Delete Stock
   // ------------------------------------------------------------
-  const handleDeleteStock = (portfolioId, index) => {
-    fetch(`http://34.238.115.102:8000/api/portfolios/${portfolioId}/${index + 1}/`, {
+  const handleDeleteStock = (portfolioId, stockId) => {
+    fetch(`http://34.238.115.102:8000/api/portfolios/${portfolioId}/holdings/${stockId}/`, {
       method: 'DELETE',
       headers: {
         Authorization: `Token ${localStorage.getItem('token')}`,
@@ -246,7 +258,7 @@ function Portfolio() {
           throw new Error('Error deleting stock');
         }
         alert('Stock removed from portfolio.');
-        fetchPortfolios();
+        updateHoldings(portfolioId, (stocks) => stocks.filter((s) => s.id !== stockId));
       })
       .catch((err) => alert(err.message));
   };
@@ -453,7 +465,7 @@ function Portfolio() {
             {/* Display portfolio stocks as cards */}
             <h4>Stocks</h4>
             <div style={{ display: 'flex', gap: '15px', flexWrap: 'wrap' }}>
-              {portfolio.stocks?.map((stock, index) => {
+              {portfolio.stocks?.map((stock) => {
                 const buyPrice = parseFloat(stock.buy_price);
                 const currentPrice = stock.current_close
                   ? parseFloat(stock.current_close)
@@ -463,7 +475,7 @@ function Portfolio() {
 
                 return (
                   <div
-                    key={index}
+                    key={stock.id}
                     style={{
                       flex: '1 1 250px',
                       border: '1px solid #eee',
@@ -486,7 +498,7 @@ function Portfolio() {
                       Profit: {profitPercent.toFixed(2)}%
                     </p>
                     <button
-                      onClick={() => handleDeleteStock(portfolio.id, index)}
+                      onClick={() => handleDeleteStock(portfolio.id, stock.id)}
                       style={{ color: 'red' }}
                     >
                       Delete
@@ -48,30 +48,19 @@ function StockDetail() {
       .catch((error) => console.error('Error fetching watchlist:', error));
   }, [id]);
 
-  // Fetch industry data for charts
+  // Fetch industry data for charts (aggregated server-side)
   useEffect(() => {
-    fetch(`http://34.238.115.102:8000/api/stocks/`, {
+    fetch(`http://34.238.115.102:8000/api/industries/`, {
       method: 'GET',
       headers: {
         'Authorization': `Token ${localStorage.getItem('token')}`,
       },
     })
       .then((res) => res.json())
-      .then((stocks) => {
-        const industryMap = {};
-        stocks.forEach((stockItem) => {
-          const industry = stockItem.industry;
-          const performance =
-            stockItem.latest_price.close_price - stockItem.latest_price.prev_close_price;
-          if (!industryMap[industry]) {
-            industryMap[industry] = { count: 0, totalPerformance: 0 };
-          }
-          industryMap[industry].count += 1;
-          industryMap[industry].totalPerformance += performance;
-        });
-        const labels = Object.keys(industryMap);
-        const counts = labels.map((industry) => industryMap[industry].count);
-        const performances = labels.map((industry) => industryMap[industry].totalPerformance);
+      .then((data) => {
+        const labels = data.industries.map((item) => item.industry);
+        const counts = data.industries.map((item) => item.count);
+        const performances = data.industries.map((item) => item.total_performance);
         setIndustryData({ labels, counts, performances });
       })
       .catch((error) => console.error('Error fetching industry data:', error));
@@ -40,7 +40,7 @@ function Watchlist() {
     const handleSearchChange = (query) => {
         setSearchQuery(query);
         if (query.length > 1) {
-            fetch(`http://34.238.115.102:8000/api/stocks/?search=${query}`, {
+            fetch(`http://34.238.115.102:8000/api/stocks/typeahead/?q=${encodeURIComponent(query)}`, {
                 headers: {
                     Authorization: `Token ${localStorage.getItem('token')}`,
                 },
@@ -0,0 +1,104 @@
+import numpy as np
+from stocks.models import StockPrice
+from stocks.risk import compute_risk
+from stocks.timeseries import load_close_matrix, forward_fill, last_valid_dates
+
+# Portfolio valuation and analytics. Holdings are valued against one close-price
+# matrix of all their stocks, loaded with a single query, so the work per request
+# is a handful of array operations whatever the number of holdings.
+
+
+def json_float(value):
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+def json_floats(values):
+    return [json_float(value) for value in values]
+
+
+def json_date(value):
+    return None if np.isnat(value) else str(value)
+
+
+def portfolio_analytics(holdings, prices=None):
+    """
+    Value a list of PortfolioStock rows (with their stocks loaded) against
+    `prices` (a StockPrice queryset, all history by default).
+
+    Returns market value, cost basis and unrealized P&L per holding and in
+    total, holding weights by market value, and the daily value and return
+    series of the current holdings (constant share counts) over the dates on
+    which every holding has a price, with its volatility, Sharpe ratio and
+    maximum drawdown.
+    """
+    if prices is None:
+        prices = StockPrice.objects.all()
+    stock_ids = [holding.stock_id for holding in holdings]
+    dates, ids, closes = load_close_matrix(prices.filter(stock_id__in=stock_ids), key='stock_id')
+
+    # One column per holding, in holding order; stocks without prices stay NaN.
+    columns = {stock_id: column for column, stock_id in enumerate(ids)}
+    matrix = np.full((len(dates), len(holdings)), np.nan)
+    for position, holding in enumerate(holdings):
+        if holding.stock_id in columns:
+            matrix[:, position] = closes[:, columns[holding.stock_id]]
+    filled = forward_fill(matrix)
+
+    shares = np.array([float(holding.shares) for holding in holdings])
+    buy_price = np.array([float(holding.buy_price) for holding in holdings])
+    if len(dates):
+        last_close = filled[-1]
+        last_date = last_valid_dates(dates, matrix)
+    else:
+        last_close = np.full(len(holdings), np.nan)
+        last_date = np.full(len(holdings), np.datetime64('NaT'), dtype='datetime64[D]')
+    market_value = shares * last_close
+    cost_basis = shares * buy_price
+    unrealized = market_value - cost_basis
+    total_value = np.nansum(market_value)
+    total_cost = np.nansum(np.where(np.isnan(market_value), np.nan, cost_basis))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pnl_pct = unrealized / cost_basis
+        weight = market_value / total_value
+
+    # Daily value of the current holdings where all of them are priced.
+    complete = ~np.isnan(filled).any(axis=1)
+    series_dates = dates[complete]
+    value = filled[complete] @ shares
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = value[1:] / value[:-1] - 1
+    risk = compute_risk(returns[:, None])
+
+    return {
+        'as_of': str(series_dates[-1]) if len(series_dates) else None,
+        'market_value': float(total_value),
+        'cost_basis': float(np.nan_to_num(total_cost)),
+        'unrealized_pnl': float(np.nansum(unrealized)),
+        'unrealized_pnl_pct': json_float(np.nansum(unrealized) / total_cost) if total_cost else None,
+        'volatility': json_float(risk['volatility'][0]),
+        'sharpe_ratio': json_float(risk['sharpe_ratio'][0]),
+        'max_drawdown': json_float(risk['max_drawdown'][0]),
+        'holdings': [
+            {
+                'id': holding.stock_id,
+                'ticker': holding.stock.ticker,
+                'shares': float(holding.shares),
+                'buy_price': float(holding.buy_price),
+                'last_close': json_float(last_close[position]),
+                'last_close_date': json_date(last_date[position]),
+                'market_value': json_float(market_value[position]),
+                'cost_basis': float(cost_basis[position]),
+                'unrealized_pnl': json_float(unrealized[position]),
+                'unrealized_pnl_pct': json_float(pnl_pct[position]),
+                'weight': json_float(weight[position]),
+            }
+            for position, holding in enumerate(holdings)
+        ],
+        'series': {
+            'dates': np.datetime_as_string(series_dates, unit='D').tolist(),
+            'value': value.tolist(),
+            # The first date has no previous value to compare against.
+            'returns': ([None] + json_floats(returns)) if len(value) else [],
+        },
+    }
@@ -1,14 +1,37 @@
-from stocks.models import Stock, StockPrice, Portfolio, Watchlist, PortfolioStock
-from rest_framework import viewsets, permissions, filters
+import time
+import numpy as np
+from stocks.models import Stock, StockPrice, Portfolio, Watchlist, PortfolioStock, StockSnapshot
+from stocks.snapshots import with_snapshots
+from stocks.fields import ScaledDecimalField
+from stocks.pagination import StockCursorPagination, StockPriceCursorPagination
+from stocks.query_params import parse_fields, model_fields, date_window
+from stocks.renderers import OHLCVBinaryRenderer
+from stocks.timeseries import load_ohlcv, downsample_ohlcv, series_to_json
+from stocks.cache import cached_response, request_key
+from stocks.risk import risk_table
+from stocks.analytics import json_floats, portfolio_analytics
+from stocks.indicators import date_rows, indicator_store, parse_indicators, spec_label
+from stocks.search import PrefixSearchFilter, typeahead_index
+from stocks.screener import screener_universe
+from stocks.correlation import DEFAULT_WINDOW, WINDOW_DAYS, correlation_matrix
+from stocks.backtest import REBALANCE_FREQUENCIES, parse_weights, run_backtest
+from stocks.holdings import apply_holdings, holding_filter, resolve_stocks
+from rest_framework.renderers import JSONRenderer, BrowsableAPIRenderer
+from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Prefetch, F, Q, Count, Sum, Max, Subquery, ExpressionWrapper
+from rest_framework import viewsets, permissions
 from django_filters.rest_framework import DjangoFilterBackend
 from .serializers import (
     StockSerializer, 
     StockPriceSerializer, 
     StockSerializerBasic,
     PortfolioSerializer, 
-    WatchlistSerializer,
-    NestedStockSerializer,
-    PortfolioStockSerializer
+    PortfolioStockSerializer,
+    HoldingItemSerializer,
+    HoldingValuesSerializer,
+    PRICE_FIELDS,
+    check_projection,
 )
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -16,14 +39,67 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import api_view, permission_classes
 
+# Mixin for ?fields= projections; the parsed projection is passed to the serializers
+# (see FieldProjectionMixin) and used by get_queryset() to load only those columns.
+class FieldProjectionViewMixin:
+    projection_prefixes = ()
+
+    def get_projection(self):
+        if not hasattr(self, '_projection'):
+            self._projection = parse_fields(self.request.query_params.get('fields'), self.projection_prefixes)
+            check_projection(self.get_serializer(), self._projection)
+        return self._projection
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_projection()
+        return context
+
+
+def basic_stocks(queryset, stock_fields):
+    # Stocks for StockSerializerBasic under a ?fields= projection (None: all fields).
+    if stock_fields is None or PRICE_FIELDS & stock_fields:
+        # Snapshot prices arrive in the same query as the stocks.
+        return with_snapshots(queryset)
+    if stock_fields:
+        # ticker is the pagination cursor.
+        return queryset.only('ticker', *model_fields(Stock, stock_fields))
+    return queryset
+
+
+def correlation_response(request, tickers):
+    # Correlation/covariance of `tickers` (?window=3m|6m|1y|all, ?from=/?to=), cached
+    # per ticker set, window and data generation whichever endpoint asks for it.
+    window = request.query_params.get('window', DEFAULT_WINDOW)
+    if window not in WINDOW_DAYS:
+        return Response({'detail': f"window must be one of {', '.join(WINDOW_DAYS)}."}, status=status.HTTP_400_BAD_REQUEST)
+    bounds = date_window(request)
+    tickers = sorted(set(tickers))
+    key = f"correlation|{','.join(tickers)}|{window}|{bounds}|{request.accepted_renderer.format}"
+
+    def build():
+        prices = StockPrice.objects.filter(**bounds)
+        return {'window': window, **correlation_matrix(prices, tickers, WINDOW_DAYS[window])}
+
+    return cached_response(request, key, build)
+
+
 # Read-only endpoint for Stock objects.
-class StockViewSet(viewsets.ReadOnlyModelViewSet):
+# Supports ?fields=ticker,prices.date,prices.close_price projections, ?from=/?to= date
+# bounds on nested prices (with_prices=true) and cursor pagination (see StockCursorPagination).
+class StockViewSet(FieldProjectionViewMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     queryset = Stock.objects.all()
     serializer_class = StockSerializer
-    filter_backends = [filters.SearchFilter, DjangoFilterBackend]
+    filter_backends = [PrefixSearchFilter, DjangoFilterBackend]
+    pagination_class = StockCursorPagination
+    projection_prefixes = ('prices',)
+    max_indicator_tickers = 50  # tickers per GET /indicators/ request
+    max_screen_results = 500  # results per GET /screen/ request
+    max_correlation_tickers = 100  # tickers per GET /correlation/ request
+    max_backtest_tickers = 500  # tickers per GET /backtest/ request
     
-    search_fields = ['ticker']            # for ?search=ADANI
+    search_fields = ['^ticker', '^company_name']  # for ?search=ADANI (prefix, see PrefixSearchFilter)
     filterset_fields = ['industry']       # for ?industry=Logistics (exact match)
 
 
@@ -32,21 +108,221 @@ class StockViewSet(viewsets.ReadOnlyModelViewSet):
             return StockSerializer
         return StockSerializerBasic
 
+    def get_queryset(self):
+        queryset = self.queryset
+        projection = self.get_projection()
+        stock_fields = projection.get(None)
+        if self.get_serializer_class() is StockSerializerBasic:
+            return basic_stocks(queryset, stock_fields)
+        if stock_fields is None or 'prices' in stock_fields:
+            # Nested prices are bounded and projected in SQL, not in Python.
+            prices = StockPrice.objects.filter(**date_window(self.request))
+            if projection.get('prices'):
+                prices = prices.only('stock', *model_fields(StockPrice, projection['prices']))
+            queryset = queryset.prefetch_related(Prefetch('prices', queryset=prices))
+        if stock_fields:
+            # ticker is the pagination cursor.
+            queryset = queryset.only('ticker', *model_fields(Stock, stock_fields))
+        return queryset
+
+    # Listings and per-stock snapshots only change on import, so they are served
+    # from the market data cache (see stocks/cache.py) with ETag support.
+    def list(self, request, *args, **kwargs):
+        return cached_response(request, request_key(request), lambda: super(StockViewSet, self).list(request, *args, **kwargs).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(request, request_key(request), lambda: super(StockViewSet, self).retrieve(request, *args, **kwargs).data)
+
+    # GET /api/stocks/<ticker>/ohlcv/?from=&to=&points=
+    # Columnar price history (dates, open, high, low, close, volume), oldest first.
+    # ?points=N downsamples to at most N bars; ?format=bin returns the packed
+    # binary layout described in OHLCVBinaryRenderer.
+    @action(detail=False, methods=['get'], url_path=r'(?P<ticker>[^/]+)/ohlcv',
+            renderer_classes=[JSONRenderer, BrowsableAPIRenderer, OHLCVBinaryRenderer])
+    def ohlcv(self, request, ticker=None):
+        points = request.query_params.get('points')
+        if points is not None:
+            try:
+                points = int(points)
+            except ValueError:
+                points = 0
+            if points < 2:
+                return Response({'detail': 'points must be an integer of at least 2.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        def build():
+            stock = get_object_or_404(Stock.objects.only('id', 'ticker'), ticker=ticker.upper())
+            series = load_ohlcv(StockPrice.objects.filter(stock=stock, **date_window(request)))
+            if points is not None:
+                series = downsample_ohlcv(series, points)
+            if request.accepted_renderer.format == OHLCVBinaryRenderer.format:
+                return series
+            return {'ticker': stock.ticker, 'count': len(series['dates']), **series_to_json(series)}
+
+        return cached_response(request, request_key(request), build)
+
+    # GET /api/stocks/typeahead/?q=tata&limit=10
+    # Up to `limit` (max 50) stocks whose ticker, company name or a word of it starts
+    # with q: exact ticker first, then ticker, name and word prefixes. Served from the
+    # in-memory TypeaheadIndex; Server-Timing reports the lookup time.
+    @action(detail=False, methods=['get'], url_path='typeahead')
+    def typeahead(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            return Response({'detail': 'limit must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        started = time.perf_counter()
+        results = typeahead_index().search(request.query_params.get('q', ''), limit)
+        elapsed = (time.perf_counter() - started) * 1000
+        return Response(results, headers={'Server-Timing': f'typeahead;dur={elapsed:.3f}'})
+
+    # GET /api/stocks/screen/?where=return_1m > 0.05 and volume_ratio_20 > 1&sort=-return_1m&limit=20
+    # Stocks matching a filter expression over derived fields (returns, volume ratios,
+    # 52-week range, risk metrics), sorted by comma-separated terms ('-' for descending).
+    # Evaluated on the in-memory ScreenerUniverse (see stocks/screener.py); Server-Timing
+    # reports the screen time.
+    @action(detail=False, methods=['get'], url_path='screen')
+    def screen(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 50)), 1), self.max_screen_results)
+        except ValueError:
+            return Response({'detail': 'limit must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        universe = screener_universe()
+        started = time.perf_counter()
+        try:
+            count, results = universe.screen(request.query_params.get('where'), request.query_params.get('sort'), limit)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        elapsed = (time.perf_counter() - started) * 1000
+        return Response(
+            {'as_of': universe.as_of, 'count': count, 'results': results},
+            headers={'Server-Timing': f'screen;dur={elapsed:.3f}'},
+        )
+
+    # GET /api/stocks/correlation/?tickers=TCS,INFY,WIPRO&window=1y&from=&to=
+    # Pairwise return correlation and annualized covariance (see stocks/correlation.py).
+    @action(detail=False, methods=['get'], url_path='correlation')
+    def correlation(self, request):
+        tickers = [ticker.strip().upper() for ticker in request.query_params.get('tickers', '').split(',') if ticker.strip()]
+        if not tickers:
+            return Response({'detail': 'tickers is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(set(tickers)) > self.max_correlation_tickers:
+            return Response({'detail': f'At most {self.max_correlation_tickers} tickers per request.'}, status=status.HTTP_400_BAD_REQUEST)
+        return correlation_response(request, tickers)
+
+    # GET /api/stocks/backtest/?weights=TCS:0.6,INFY:0.4&rebalance=monthly&capital=10000&from=&to=
+    # Equity curve, TWR, CAGR, volatility, Sharpe ratio and max drawdown of fixed
+    # weights (see stocks/backtest.py); a ticker without a weight counts 1.
+    @action(detail=False, methods=['get'], url_path='backtest')
+    def backtest(self, request):
+        rebalance = request.query_params.get('rebalance', 'none')
+        if rebalance not in REBALANCE_FREQUENCIES:
+            return Response({'detail': f"rebalance must be one of {', '.join(REBALANCE_FREQUENCIES)}."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            weights = parse_weights(request.query_params.get('weights'))
+            capital = float(request.query_params.get('capital', 1))
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if len(weights) > self.max_backtest_tickers:
+            return Response({'detail': f'At most {self.max_backtest_tickers} tickers per request.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not np.isfinite(capital) or capital <= 0:
+            return Response({'detail': 'capital must be a positive number.'}, status=status.HTTP_400_BAD_REQUEST)
+        prices = StockPrice.objects.filter(**date_window(request))
+        return cached_response(request, request_key(request), lambda: run_backtest(prices, weights=weights, rebalance=rebalance, capital=capital))
+
+    # GET /api/stocks/risk/?tickers=TCS,INFY&industry=&from=&to=
+    # Volatility, Sharpe ratio, max drawdown and risk score (see stocks/risk.py)
+    # for every matching ticker, computed together from one price query.
+    @action(detail=False, methods=['get'], url_path='risk')
+    def risk(self, request):
+        def build():
+            prices = StockPrice.objects.filter(**date_window(request))
+            tickers = request.query_params.get('tickers')
+            if tickers:
+                prices = prices.filter(stock__ticker__in=[ticker.strip().upper() for ticker in tickers.split(',')])
+            industry = request.query_params.get('industry')
+            if industry:
+                prices = prices.filter(stock__industry=industry)
+            return risk_table(prices)
+
+        return cached_response(request, request_key(request), build)
+
+    # GET /api/stocks/indicators/?tickers=TCS,INFY&indicators=sma:50,rsi:14,bollinger:20:2&from=&to=
+    # Technical indicators (see stocks/indicators.py) per ticker as columns over its
+    # trading days, oldest first. Indicators are computed over the whole history and
+    # then cut to ?from=/?to=, so windows are already filled at the start of the range.
+    @action(detail=False, methods=['get'], url_path='indicators')
+    def indicators(self, request):
+        tickers = list(dict.fromkeys(
+            ticker.strip().upper() for ticker in request.query_params.get('tickers', '').split(',') if ticker.strip()
+        ))
+        if not tickers:
+            return Response({'detail': 'tickers is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(tickers) > self.max_indicator_tickers:
+            return Response({'detail': f'At most {self.max_indicator_tickers} tickers per request.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            specs = parse_indicators(request.query_params.get('indicators'))
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        window = date_window(request)
+
+        def build():
+            stock_ids = dict(Stock.objects.filter(ticker__in=tickers).values_list('ticker', 'id'))
+            found = [ticker for ticker in tickers if ticker in stock_ids]
+            computed = indicator_store().compute([stock_ids[ticker] for ticker in found], specs)
+            results = []
+            for ticker in found:
+                dates, inputs, columns = computed[stock_ids[ticker]]
+                rows = date_rows(dates, window.get('date__gte'), window.get('date__lte'))
+                result = {
+                    'ticker': ticker,
+                    'count': len(dates[rows]),
+                    'dates': np.datetime_as_string(dates[rows], unit='D').tolist(),
+                    'close': json_floats(inputs['close'][rows]),
+                }
+                for name, values in columns.items():
+                    result[name] = json_floats(values[rows])
+                results.append(result)
+            return {
+                'indicators': [spec_label(spec) for spec in specs],
+                'results': results,
+                'not_found': [ticker for ticker in tickers if ticker not in stock_ids],
+            }
+
+        return cached_response(request, request_key(request), build)
+
 
 # Read-only endpoint for StockPrice objects.
-class StockPriceViewSet(viewsets.ReadOnlyModelViewSet):
+# Supports ?stock=<id> / ?stock__ticker=<ticker>, ?from=/?to= date bounds, ?fields=
+# projections and cursor pagination (newest first).
+class StockPriceViewSet(FieldProjectionViewMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     queryset = StockPrice.objects.all()
     serializer_class = StockPriceSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['stock', 'stock__ticker']
+    pagination_class = StockPriceCursorPagination
+
+    def get_queryset(self):
+        queryset = self.queryset.filter(**date_window(self.request))
+        price_fields = self.get_projection().get(None)
+        if price_fields:
+            # date and stock are the pagination cursor.
+            queryset = queryset.only('date', 'stock', *model_fields(StockPrice, price_fields))
+        return queryset
 
 # CRUD endpoint for Portfolio objects.
 
 class PortfolioViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = PortfolioSerializer
+    max_bulk_holdings = 1000  # items per POST /holdings/ request
 
     def get_queryset(self):
-        return Portfolio.objects.filter(owner=self.request.user)
+        # Holdings and their stocks load in one extra query; prices are batched by the serializer.
+        # Both portfolios and holdings are listed in creation order.
+        return Portfolio.objects.filter(owner=self.request.user).order_by('id').prefetch_related(
+            Prefetch('portfoliostock_set', queryset=PortfolioStock.objects.select_related('stock').order_by('id'))
+        )
     
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
@@ -54,7 +330,8 @@ class PortfolioViewSet(viewsets.ModelViewSet):
     # Custom action to add, retrieve, or delete a stock on a portfolio.
     # URL: /api/portfolios/<portfolio_pk>/<stock_param>/
     # When POST: interprets stock_param as the Stock's primary key to add.
-    # When GET or DELETE: interprets stock_param as a 1-indexed position in the portfolio.
+    # When GET or DELETE: interprets stock_param as a 1-indexed position in the portfolio
+    # (in creation order). Prefer the stable holdings/<stock_key>/ routes below.
     @action(detail=True, methods=['get', 'post', 'delete'], url_path=r'(?P<stock_param>\d+)')
     def stock(self, request, pk=None, stock_param=None):
         portfolio = self.get_object()
@@ -104,21 +381,171 @@ class PortfolioViewSet(viewsets.ModelViewSet):
         serializer = PortfolioStockSerializer(ps)
         return Response(serializer.data)
 
+    # GET /api/portfolios/<portfolio_pk>/holdings/
+    # The portfolio's holdings in creation order.
+    # POST /api/portfolios/<portfolio_pk>/holdings/
+    # Body: a list (or {"holdings": [...]}) of {"ticker" or "id", "buy_price", "shares"}
+    # to add or update, or {"ticker" or "id", "remove": true} to remove. All stocks
+    # resolve in one query and all changes commit together; returns a status per item.
+    @action(detail=True, methods=['get', 'post'], url_path='holdings')
+    def holdings(self, request, pk=None):
+        portfolio = self.get_object()
+        if request.method.lower() == 'get':
+            return Response(PortfolioStockSerializer(portfolio.portfoliostock_set.all(), many=True).data)
+
+        items = request.data.get('holdings') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response({'detail': 'Expected a non-empty list of holdings.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.max_bulk_holdings:
+            return Response({'detail': f'At most {self.max_bulk_holdings} holdings per request.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = [None] * len(items)
+        valid = []
+        for index, item in enumerate(items):
+            serializer = HoldingItemSerializer(data=item)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index] = {'status': 'error', 'errors': serializer.errors}
+        applied = apply_holdings(portfolio, [data for _, data in valid])
+        for (index, _), result in zip(valid, applied):
+            results[index] = result
+
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        return Response({'results': results, 'counts': counts})
+
+    # /api/portfolios/<portfolio_pk>/holdings/<stock_key>/, stock_key being a stock id or ticker.
+    # GET returns the holding, PUT creates or replaces it (buy_price, shares), PATCH
+    # updates it and DELETE removes it. Mutations return the holding as stored, so
+    # clients can update their copy without re-fetching the portfolio.
+    @action(detail=True, methods=['get', 'put', 'patch', 'delete'], url_path=r'holdings/(?P<stock_key>[^/.]+)')
+    def holding(self, request, pk=None, stock_key=None):
+        portfolio = get_object_or_404(Portfolio.objects.filter(owner=request.user).only('id'), pk=pk)
+        holding = PortfolioStock.objects.select_related('stock').filter(
+            portfolio=portfolio, **holding_filter(stock_key)
+        ).first()
+
+        if request.method.lower() == 'put' and holding is None:
+            stock_id = int(stock_key) if stock_key.isdigit() else None
+            stock = resolve_stocks([(stock_id, stock_key)])[0]
+            if stock is None:
+                return Response({'detail': 'Stock not found'}, status=status.HTTP_404_NOT_FOUND)
+            serializer = HoldingValuesSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            holding = serializer.save(portfolio=portfolio, stock=stock)
+            return Response(PortfolioStockSerializer(holding).data, status=status.HTTP_201_CREATED)
+
+        if holding is None:
+            return Response({'detail': 'Stock not found in portfolio'}, status=status.HTTP_404_NOT_FOUND)
+        if request.method.lower() == 'delete':
+            holding.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        if request.method.lower() in ('put', 'patch'):
+            serializer = HoldingValuesSerializer(holding, data=request.data, partial=request.method.lower() == 'patch')
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        return Response(PortfolioStockSerializer(holding).data)
+
+    # GET /api/portfolios/<portfolio_pk>/analytics/?from=&to=
+    # Valuation, unrealized P&L, weights and the daily value/return series of the
+    # holdings (see stocks/analytics.py), from one holdings query and one price query.
+    @action(detail=True, methods=['get'], url_path='analytics')
+    def analytics(self, request, pk=None):
+        portfolio = self.get_object()
+        holdings = list(portfolio.portfoliostock_set.all())
+        data = portfolio_analytics(holdings, StockPrice.objects.filter(**date_window(request)))
+        return Response({'id': portfolio.id, 'name': portfolio.name, **data})
+
+    # GET /api/portfolios/<portfolio_pk>/backtest/?rebalance=monthly&from=&to=
+    # Backtest of the current holdings (see stocks/backtest.py): their shares are held
+    # from the first date on which all are priced, or rebalanced back to those
+    # starting proportions every period.
+    @action(detail=True, methods=['get'], url_path='backtest')
+    def backtest(self, request, pk=None):
+        rebalance = request.query_params.get('rebalance', 'none')
+        if rebalance not in REBALANCE_FREQUENCIES:
+            return Response({'detail': f"rebalance must be one of {', '.join(REBALANCE_FREQUENCIES)}."}, status=status.HTTP_400_BAD_REQUEST)
+        portfolio = get_object_or_404(Portfolio.objects.filter(owner=request.user).only('id', 'name'), pk=pk)
+        shares = dict(portfolio.portfoliostock_set.values_list('stock__ticker', 'shares'))
+        data = run_backtest(StockPrice.objects.filter(**date_window(request)), shares=shares, rebalance=rebalance)
+        return Response({'id': portfolio.id, 'name': portfolio.name, **data})
+
+    # GET /api/portfolios/<portfolio_pk>/correlation/?window=1y&from=&to=
+    # Correlation and covariance of the portfolio's stocks (see correlation_response).
+    @action(detail=True, methods=['get'], url_path='correlation')
+    def correlation(self, request, pk=None):
+        portfolio = get_object_or_404(Portfolio.objects.filter(owner=request.user).only('id'), pk=pk)
+        return correlation_response(request, portfolio.stocks.values_list('ticker', flat=True))
+
+# Per-industry aggregate of every stock's latest trading day, in one grouped query.
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_industries(request):
+    """
+    GET /api/industries/
+    Returns, for every industry: the number of stocks, the summed and mean daily
+    performance (close - previous close) of their latest prices and market
+    breadth (advancers, decliners, unchanged). Latest prices come from the
+    stock snapshots, so a stock that stopped trading still counts once.
+    """
+    def build():
+        # Prices are scaled integers in the database; keep the field so results are scaled back.
+        price = ScaledDecimalField(max_digits=15, decimal_places=4)
+        change = ExpressionWrapper(F('close_price') - F('prev_close_price'), output_field=price)
+        rows = (
+            StockPrice.objects.filter(id__in=Subquery(StockSnapshot.objects.values('latest')))
+            .values(industry=F('stock__industry'))
+            .annotate(
+                date=Max('date'),
+                count=Count('id'),
+                total_performance=Sum(change),
+                advancers=Count('id', filter=Q(close_price__gt=F('prev_close_price'))),
+                decliners=Count('id', filter=Q(close_price__lt=F('prev_close_price'))),
+                unchanged=Count('id', filter=Q(close_price=F('prev_close_price'))),
+            )
+            .order_by('industry')
+        )
+        industries = list(rows)
+        for row in industries:
+            # Not Avg(): Django truncates integer-typed aggregates before the field converts them.
+            row['mean_performance'] = row['total_performance'] / row['count']
+        dates = [row.pop('date') for row in industries]
+        return {'date': max(dates) if dates else None, 'industries': industries}
+
+    return cached_response(request, request_key(request), build)
+
 # CRUD endpoint for Watchlist objects.
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_watchlist(request):
     """
-    GET /api/watchlist/
-    Returns the authenticated user's watchlist (stocks list).
+    GET /api/watchlist/?fields=
+    Returns the authenticated user's watchlist (stocks list), by ticker. The stocks
+    and their snapshot prices come from one joined query; ?fields= projects the
+    stock fields as on /api/stocks/ (e.g. drop risk to skip its prefetch).
     """
-    try:
-        watchlist = Watchlist.objects.get(owner=request.user)
-    except Watchlist.DoesNotExist:
+    fields = parse_fields(request.query_params.get('fields'))
+    check_projection(StockSerializerBasic(context={'fields': fields}), fields)
+    watchlist_id = Watchlist.objects.filter(owner=request.user).values_list('id', flat=True).first()
+    if watchlist_id is None:
         # If the user does not have a watchlist, return an empty list.
         return Response({"stocks": []}, status=status.HTTP_200_OK)
-    serializer = WatchlistSerializer(watchlist)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    stocks = with_snapshots(Stock.objects.filter(watchlists=watchlist_id)).order_by('ticker')
+    serializer = StockSerializerBasic(stocks, many=True, context={'request': request, 'fields': fields})
+    return Response({"id": watchlist_id, "stocks": serializer.data}, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_watchlist_correlation(request):
+    """
+    GET /api/watchlist/correlation/?window=1y&from=&to=
+    Returns the correlation and covariance matrices of the authenticated user's
+    watchlist stocks (see correlation_response); an empty watchlist gives empty matrices.
+    """
+    tickers = Stock.objects.filter(watchlists__owner=request.user).values_list('ticker', flat=True)
+    return correlation_response(request, tickers)
 
 @api_view(['POST', 'DELETE'])
 @permission_classes([IsAuthenticated])
@@ -126,17 +553,61 @@ def change_watchlist(request, stock_id):
     """
     POST /api/watchlist/<stock_id> → Adds the stock.
     DELETE /api/watchlist/<stock_id> → Removes the stock.
+    Works on the watchlist/stock through table directly: no stock or membership
+    objects are loaded, and adding an already watched stock is a no-op.
     """
-    # Get or create a watchlist for the user.
-    watchlist, created = Watchlist.objects.get_or_create(owner=request.user)
-    try:
-        stock = Stock.objects.get(id=stock_id)
-    except Stock.DoesNotExist:
-        return Response({"error": "Stock not found"}, status=status.HTTP_404_NOT_FOUND)
-    
+    WatchlistStock = Watchlist.stocks.through
     if request.method == 'POST':
-        watchlist.stocks.add(stock)
+        if not Stock.objects.filter(id=stock_id).exists():
+            return Response({"error": "Stock not found"}, status=status.HTTP_404_NOT_FOUND)
+        # Get or create a watchlist for the user.
+        watchlist, created = Watchlist.objects.only('id').get_or_create(owner=request.user)
+        WatchlistStock.objects.bulk_create(
+            [WatchlistStock(watchlist_id=watchlist.id, stock_id=stock_id)], ignore_conflicts=True
+        )
         return Response({"message": "Stock added to watchlist"}, status=status.HTTP_200_OK)
     else:  # DELETE
-        watchlist.stocks.remove(stock)
-        return Response({"message": "Stock removed from watchlist"}, status=status.HTTP_200_OK)
\ No newline at end of file
+        removed, _ = WatchlistStock.objects.filter(watchlist__owner=request.user, stock_id=stock_id).delete()
+        if not removed and not Stock.objects.filter(id=stock_id).exists():
+            return Response({"error": "Stock not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"message": "Stock removed from watchlist"}, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_change_watchlist(request):
+    """
+    POST /api/watchlist/bulk/ with {"add": [...], "remove": [...]}
+    Stocks are given by id or ticker. All of them resolve with one query and the
+    changes are applied with one insert and one delete (removal wins for a stock in
+    both lists). Returns the ids added and removed, and the references that matched
+    no stock.
+    """
+    add = request.data.get('add', [])
+    remove = request.data.get('remove', [])
+    if not isinstance(add, list) or not isinstance(remove, list):
+        return Response({"error": "add and remove must be lists."}, status=status.HTTP_400_BAD_REQUEST)
+    refs = [
+        (int(ref), None) if str(ref).isdigit() else (None, str(ref))
+        for ref in add + remove
+    ]
+    stocks = resolve_stocks(refs)
+    not_found = [ref for ref, stock in zip(add + remove, stocks) if stock is None]
+    remove_ids = {stock.id for stock in stocks[len(add):] if stock is not None}
+    # A stock listed in both is removed.
+    add_ids = {stock.id for stock in stocks[:len(add)] if stock is not None} - remove_ids
+
+    WatchlistStock = Watchlist.stocks.through
+    with transaction.atomic():
+        watchlist, created = Watchlist.objects.only('id').get_or_create(owner=request.user)
+        if add_ids:
+            WatchlistStock.objects.bulk_create(
+                [WatchlistStock(watchlist_id=watchlist.id, stock_id=stock_id) for stock_id in add_ids],
+                ignore_conflicts=True,
+            )
+        if remove_ids:
+            WatchlistStock.objects.filter(watchlist_id=watchlist.id, stock_id__in=remove_ids).delete()
+    return Response({
+        "added": sorted(add_ids),
+        "removed": sorted(remove_ids),
+        "not_found": not_found,
+    }, status=status.HTTP_200_OK)
@@ -0,0 +1,159 @@
+import functools
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from knox.auth import TokenAuthentication
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from stocks.api import basic_stocks
+from stocks.cache import async_cached_response
+from stocks.models import Stock, StockPrice, Watchlist
+from stocks.query_params import parse_fields, date_window
+from stocks.renderers import OHLCVBinaryRenderer
+from stocks.search import prefix_search
+from stocks.serializers import StockSerializerBasic, check_projection
+from stocks.snapshots import with_snapshots
+from stocks.timeseries import load_ohlcv, downsample_ohlcv, series_to_json
+
+# Async (ASGI) versions of the hot read endpoints, served under /api/async/ with
+# the same JSON as their DRF counterparts (DRF views are sync-only).
+#
+# Under an ASGI server (see StockMarket/asgi.py) a request only holds a thread
+# while it runs a query: database work goes through Django's async ORM or
+# sync_to_async, which gives each request its own thread. A slow aggregate on
+# one request therefore does not queue cached reads and cheap lookups behind
+# it, and slow or idle clients cost a coroutine rather than a worker.
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    # Rendered exactly as DRF's JSONRenderer renders the sync endpoints.
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status)
+
+
+def error_response(exc):
+    # Same body and headers as DRF's default exception handler.
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = json_response(data, status=exc.status_code)
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        response['WWW-Authenticate'] = TokenAuthentication().authenticate_header(None)
+    return response
+
+
+def async_api_view(view):
+    """
+    Decorator for the async GET views below: wraps the request in a DRF
+    Request (for query_params and the serializers), authenticates it with the
+    knox token like the sync API and turns API exceptions into DRF-style
+    error responses.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request = Request(request)
+        try:
+            if request.method not in ('GET', 'HEAD'):
+                raise exceptions.MethodNotAllowed(request.method)
+            # Knox checks the token (and may renew it) in the database.
+            authenticated = await sync_to_async(TokenAuthentication().authenticate)(request)
+            if authenticated is None:
+                raise exceptions.NotAuthenticated()
+            request.user, request.auth = authenticated
+            return await view(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return error_response(exc)
+    return wrapper
+
+
+def request_key(request, format='json'):
+    return f'async|{request.build_absolute_uri()}|{format}'
+
+
+# GET /api/async/stocks/?search=&industry=&fields=
+# The unpaginated stock list of GET /api/stocks/, with snapshot prices and risk.
+@async_api_view
+async def stock_list(request):
+    fields = parse_fields(request.query_params.get('fields'))
+    check_projection(StockSerializerBasic(context={'fields': fields}), fields)
+
+    def build():
+        stocks = prefix_search(Stock.objects.all(), request.query_params.get('search', ''))
+        industry = request.query_params.get('industry')
+        if industry:
+            stocks = stocks.filter(industry=industry)
+        stocks = basic_stocks(stocks, fields.get(None))
+        return StockSerializerBasic(stocks, many=True, context={'request': request, 'fields': fields}).data
+
+    return await async_cached_response(request, request_key(request), sync_to_async(build), json_response)
+
+
+# GET /api/async/stocks/<id>/?fields=
+# One stock's snapshot prices and risk, as GET /api/stocks/<id>/.
+@async_api_view
+async def stock_detail(request, pk):
+    fields = parse_fields(request.query_params.get('fields'))
+    check_projection(StockSerializerBasic(context={'fields': fields}), fields)
+
+    async def build():
+        try:
+            stock = await basic_stocks(Stock.objects.all(), fields.get(None)).aget(pk=pk)
+        except Stock.DoesNotExist:
+            raise exceptions.NotFound('No Stock matches the given query.')
+        # risk_metrics is read while serializing, so this runs in a thread too.
+        serializer = StockSerializerBasic(stock, context={'request': request, 'fields': fields})
+        return await sync_to_async(lambda: serializer.data)()
+
+    return await async_cached_response(request, request_key(request), build, json_response)
+
+
+# GET /api/async/stocks/<ticker>/ohlcv/?from=&to=&points=&format=bin
+# Columnar price history, as GET /api/stocks/<ticker>/ohlcv/; ?format=bin or
+# Accept: application/octet-stream selects the OHLCVBinaryRenderer layout.
+@async_api_view
+async def stock_ohlcv(request, ticker):
+    points = request.query_params.get('points')
+    if points is not None:
+        try:
+            points = int(points)
+        except ValueError:
+            points = 0
+        if points < 2:
+            raise exceptions.ParseError('points must be an integer of at least 2.')
+    bounds = date_window(request)
+    format = request.query_params.get('format')
+    if format is None and OHLCVBinaryRenderer.media_type in request.headers.get('Accept', ''):
+        format = OHLCVBinaryRenderer.format
+    binary = format == OHLCVBinaryRenderer.format
+
+    async def build():
+        try:
+            stock = await Stock.objects.only('id', 'ticker').aget(ticker=ticker.upper())
+        except Stock.DoesNotExist:
+            raise exceptions.NotFound('No Stock matches the given query.')
+        # The raw columnar fetch has no async variant.
+        series = await sync_to_async(load_ohlcv)(StockPrice.objects.filter(stock=stock, **bounds))
+        if points is not None:
+            series = downsample_ohlcv(series, points)
+        if binary:
+            return series
+        return {'ticker': stock.ticker, 'count': len(series['dates']), **series_to_json(series)}
+
+    def render(data):
+        if binary:
+            return HttpResponse(OHLCVBinaryRenderer().render(data), content_type=OHLCVBinaryRenderer.media_type)
+        return json_response(data)
+
+    return await async_cached_response(request, request_key(request, 'bin' if binary else 'json'), build, render)
+
+
+# GET /api/async/watchlist/?fields=
+# The authenticated user's watchlist, as GET /api/watchlist/.
+@async_api_view
+async def watchlist(request):
+    fields = parse_fields(request.query_params.get('fields'))
+    check_projection(StockSerializerBasic(context={'fields': fields}), fields)
+    watchlist_id = await Watchlist.objects.filter(owner=request.user).values_list('id', flat=True).afirst()
+    if watchlist_id is None:
+        return json_response({"stocks": []})
+    stocks = [stock async for stock in with_snapshots(Stock.objects.filter(watchlists=watchlist_id)).order_by('ticker')]
+    # Risk metrics are prefetched while serializing.
+    serializer = StockSerializerBasic(stocks, many=True, context={'request': request, 'fields': fields})
+    return json_response({"id": watchlist_id, "stocks": await sync_to_async(lambda: serializer.data)()})
@@ -0,0 +1,146 @@
+import numpy as np
+from stocks.analytics import json_date, json_float, json_floats
+from stocks.risk import compute_risk, metric_values, METRICS
+from stocks.timeseries import load_close_matrix, forward_fill
+
+# Historical backtest of fixed weights or share counts over imported closes.
+#
+# Holdings are reset to their target weights at the close of each rebalance
+# row and drift with prices in between, so a period's value is one matrix
+# product (price growth since the period's start x weights) and the whole
+# equity curve is a handful of array operations, whatever the number of rows.
+
+REBALANCE_FREQUENCIES = ('none', 'weekly', 'monthly', 'quarterly', 'yearly')
+DAYS_PER_YEAR = 365.25
+
+
+def parse_weights(value):
+    """
+    Parse "TCS:0.6,INFY:0.4" into {ticker: weight}; a ticker without a weight
+    counts 1, so "TCS,INFY" is equal-weighted. Weights are relative (they are
+    normalized by the backtest) and must be non-negative. Raises ValueError.
+    """
+    weights = {}
+    for item in (value or '').split(','):
+        ticker, _, weight = item.partition(':')
+        ticker = ticker.strip().upper()
+        if not ticker:
+            continue
+        try:
+            weight = float(weight) if weight.strip() else 1.0
+        except ValueError:
+            raise ValueError(f"Invalid weight for '{ticker}'.")
+        if not np.isfinite(weight) or weight < 0:
+            raise ValueError(f"Invalid weight for '{ticker}'.")
+        if ticker in weights:
+            raise ValueError(f"'{ticker}' is listed twice.")
+        weights[ticker] = weight
+    if not weights:
+        raise ValueError('weights is required.')
+    if sum(weights.values()) <= 0:
+        raise ValueError('Weights must not all be zero.')
+    return weights
+
+
+def period_keys(dates, frequency):
+    # An integer per date that changes when a new week (Monday), month, quarter or year starts.
+    if frequency == 'weekly':
+        # 1970-01-01 was a Thursday.
+        return (dates.astype(np.int64) + 3) // 7
+    if frequency == 'monthly':
+        return dates.astype('datetime64[M]').astype(np.int64)
+    if frequency == 'quarterly':
+        return dates.astype('datetime64[M]').astype(np.int64) // 3
+    return dates.astype('datetime64[Y]').astype(np.int64)
+
+
+def rebalance_rows(dates, frequency):
+    # The first row and the last trading day of every period followed by another one.
+    if frequency == 'none' or len(dates) < 2:
+        return np.zeros(1, dtype=np.int64)
+    keys = period_keys(dates, frequency)
+    return np.union1d(0, np.flatnonzero(keys[1:] != keys[:-1]))
+
+
+def equity_curve(prices, weights, anchors, capital=1.0):
+    """
+    Portfolio value on every row of a complete (dates x stocks) price matrix,
+    starting at `capital` with `weights` (summing to 1) and rebalanced back to
+    them at the close of each row in `anchors` (sorted, starting with 0).
+    """
+    rows = np.arange(len(prices))
+    # Each row belongs to the period of the last rebalance strictly before it.
+    period = np.maximum(np.searchsorted(anchors, rows, side='left') - 1, 0)
+    growth = prices / prices[anchors[period]]
+    relative = growth @ weights
+    # Value at each rebalance: compounded from the end value of every earlier period.
+    anchor_value = np.cumprod(np.concatenate(([1.0], relative[anchors[1:]])))
+    return capital * anchor_value[period] * relative
+
+
+def run_backtest(prices, weights=None, shares=None, rebalance='none', capital=1.0):
+    """
+    Backtest a StockPrice queryset (its date range) for either target
+    `weights` or held `shares`, both dicts keyed by ticker.
+
+    Weights are normalized and the curve starts at `capital`; shares start at
+    their market value on the first date and are held in those proportions.
+    The backtest starts on the first date on which every stock has a price
+    (missing days later on carry the previous close); stocks without any
+    price are excluded. Returns the equity curve and daily returns with total
+    time-weighted return, CAGR, volatility, Sharpe ratio and max drawdown.
+    """
+    requested = weights if weights is not None else shares
+    dates, tickers, closes = load_close_matrix(prices.filter(stock__ticker__in=list(requested)))
+    amounts = np.array([float(requested[ticker]) for ticker in tickers])
+    result = {
+        'rebalance': rebalance,
+        'excluded': sorted(set(requested) - set(tickers)),
+        'start': None,
+        'end': None,
+        'rebalances': 0,
+        'weights': {},
+        'initial_value': None,
+        'final_value': None,
+        'twr': None,
+        'cagr': None,
+        **dict.fromkeys(METRICS),
+        'observations': 0,
+        'series': {'dates': [], 'equity': [], 'returns': []},
+    }
+    filled = forward_fill(closes)
+    complete = np.flatnonzero(~np.isnan(filled).any(axis=1)) if len(tickers) else []
+    if not len(complete) or amounts.sum() <= 0:
+        return result
+    dates, filled = dates[complete[0]:], filled[complete[0]:]
+
+    if weights is None:
+        # Held shares: start from their market value, in those proportions.
+        amounts = amounts * filled[0]
+        capital = amounts.sum()
+    target = amounts / amounts.sum()
+    anchors = rebalance_rows(dates, rebalance)
+    equity = equity_curve(filled, target, anchors, capital)
+    returns = equity[1:] / equity[:-1] - 1
+
+    years = (dates[-1] - dates[0]).astype(np.int64) / DAYS_PER_YEAR
+    growth = equity[-1] / equity[0]
+    result.update({
+        'start': json_date(dates[0]),
+        'end': json_date(dates[-1]),
+        'rebalances': len(anchors) - 1,
+        'weights': dict(zip(tickers, target.tolist())),
+        'initial_value': json_float(equity[0]),
+        'final_value': json_float(equity[-1]),
+        'twr': json_float(growth - 1),
+        'cagr': json_float(growth ** (1 / years) - 1) if years > 0 else None,
+        'series': {
+            'dates': np.datetime_as_string(dates, unit='D').tolist(),
+            'equity': json_floats(equity),
+            'returns': [None] + json_floats(returns),
+        },
+    })
+    if len(returns):
+        metrics = metric_values(compute_risk(returns[:, None]), 0)
+        result.update({name: metrics[name] for name in METRICS}, observations=metrics['observations'])
+    return result
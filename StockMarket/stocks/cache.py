@@ -0,0 +1,83 @@
+import hashlib
+import time
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+# Read-through cache for market data responses.
+#
+# Price data only changes when import_all_csv runs, so cached values never
+# expire on their own: every key embeds the current "data generation", which
+# the import command replaces after writing. Values live in the per-process
+# 'default' cache; the generation lives in the shared 'market_data' cache so a
+# bump made by the import process is seen by every server process.
+
+GENERATION_KEY = 'market-data-generation'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def data_generation():
+    generation = caches['market_data'].get(GENERATION_KEY)
+    if generation is None:
+        # A fresh stamp (never an old one) so a wiped counter cannot revive stale entries.
+        caches['market_data'].add(GENERATION_KEY, time.time_ns(), timeout=None)
+        generation = caches['market_data'].get(GENERATION_KEY)
+    return generation
+
+
+def bump_generation():
+    generation = time.time_ns()
+    caches['market_data'].set(GENERATION_KEY, generation, timeout=None)
+    return generation
+
+
+def cache_key(*parts):
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def cached_response(request, key, build):
+    """
+    Serve build() (response data) for `key` from the cache, with an ETag tied
+    to the key and data generation. A matching If-None-Match is answered with
+    304 before anything is loaded or built.
+    """
+    versioned = versioned_key(data_generation(), key)
+    etag = quote_etag(versioned)
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    data = caches['default'].get(versioned)
+    if data is None:
+        data = build()
+        caches['default'].set(versioned, data, CACHE_TIMEOUT)
+    return Response(data, headers={'ETag': etag})
+
+
+async def async_cached_response(request, key, build, render):
+    """
+    cached_response() for async views: `build` is a coroutine function and
+    render(data) makes the HttpResponse for the (possibly cached) data.
+    """
+    versioned = versioned_key(await sync_to_async(data_generation)(), key)
+    etag = quote_etag(versioned)
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        data = await caches['default'].aget(versioned)
+        if data is None:
+            data = await build()
+            await caches['default'].aset(versioned, data, CACHE_TIMEOUT)
+        response = render(data)
+    response['ETag'] = etag
+    return response
+
+
+def versioned_key(generation, key):
+    return f'market:{cache_key(generation, key)}'
+
+
+def request_key(request):
+    # Responses vary by URL (including host and query string) and negotiated format.
+    return f'{request.build_absolute_uri()}|{request.accepted_renderer.format}'
@@ -0,0 +1,73 @@
+import numpy as np
+from stocks.analytics import json_date, json_floats
+from stocks.risk import TRADING_DAYS, WINDOWS
+from stocks.timeseries import daily_returns, forward_fill, load_close_matrix
+
+# Pairwise correlation and covariance of daily returns, for spotting
+# concentration across a watchlist or portfolio. Windows are the risk.WINDOWS
+# lookbacks, counted in aligned trading days.
+
+WINDOW_DAYS = dict(WINDOWS)
+DEFAULT_WINDOW = '1y'
+
+
+def aligned_returns(closes, count=None):
+    """
+    Daily returns of a (dates x tickers) close matrix on common dates.
+
+    A ticker without a row on some date is carried at its previous close (a
+    flat day) between its first and last prices; only dates on which every
+    ticker then has a return are kept, the last `count` of them. Returns
+    (row indexes into the returns, returns matrix).
+    """
+    rows = np.arange(closes.shape[0])[:, None]
+    found = ~np.isnan(closes)
+    last = closes.shape[0] - 1 - np.argmax(found[::-1], axis=0)
+    filled = np.where(rows <= last, forward_fill(closes), np.nan)
+    returns = daily_returns(filled)
+    complete = np.flatnonzero(~np.isnan(returns).any(axis=1))
+    if count is not None:
+        complete = complete[-count:]
+    return complete, returns[complete]
+
+
+def correlation_matrix(prices, tickers, count=None):
+    """
+    Correlation and annualized covariance of the daily returns of `tickers`
+    over a StockPrice queryset, from one price query and a single covariance
+    product; correlations are scaled from it. Tickers without prices are
+    listed as excluded. Undefined values (fewer than two aligned returns, or
+    a constant price) are None.
+    """
+    dates, found, closes = load_close_matrix(prices.filter(stock__ticker__in=tickers))
+    result = {
+        'tickers': found,
+        'excluded': sorted(set(tickers) - set(found)),
+        'observations': 0,
+        'start': None,
+        'end': None,
+    }
+    size = len(found)
+    covariance = np.full((size, size), np.nan)
+    if len(dates) >= 2 and size:
+        rows, returns = aligned_returns(closes, count)
+        result['observations'] = len(rows)
+        if len(rows):
+            # Return row i is the change into dates[i + 1].
+            result['start'] = json_date(dates[rows[0] + 1])
+            result['end'] = json_date(dates[rows[-1] + 1])
+        if len(rows) >= 2:
+            covariance = np.atleast_2d(np.cov(returns, rowvar=False)) * TRADING_DAYS
+    volatility = np.sqrt(np.diag(covariance))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlation = np.clip(covariance / np.outer(volatility, volatility), -1, 1)
+    np.fill_diagonal(correlation, np.where(volatility > 0, 1.0, np.nan))
+
+    result['volatility'] = json_floats(volatility)
+    result['correlation'] = [json_floats(row) for row in correlation]
+    result['covariance'] = [json_floats(row) for row in covariance]
+    # Mean correlation of distinct pairs: a single-number concentration gauge.
+    pairs = correlation[np.triu_indices(size, 1)]
+    pairs = pairs[~np.isnan(pairs)]
+    result['average_correlation'] = float(pairs.mean()) if len(pairs) else None
+    return result
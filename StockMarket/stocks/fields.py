@@ -0,0 +1,42 @@
+from decimal import Decimal, ROUND_HALF_EVEN
+from django.db import models
+
+
+class ScaledDecimalField(models.DecimalField):
+    """
+    A DecimalField stored as a BigInteger count of 10**-decimal_places units,
+    e.g. 730.05 with 4 decimal places is stored as 7300500.
+
+    Python values, validation, forms and DRF serializers behave exactly like
+    DecimalField; only the column holds compact integers, which SQLite keeps as
+    variable-length ints and reads back without parsing text or REALs.
+
+    Raw SQL (and the raw-cursor loaders in stocks.timeseries) sees the scaled
+    integers, and expressions that derive a new output field from this one
+    (e.g. Avg, or F() arithmetic) must set output_field to a ScaledDecimalField
+    to be scaled back.
+    """
+
+    @property
+    def scale(self):
+        return 10 ** self.decimal_places
+
+    def get_internal_type(self):
+        return 'BigIntegerField'
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        # Lookups pass prepared Decimals too, so scale whether prepared or not.
+        if hasattr(value, 'as_sql'):
+            return value
+        value = self.get_prep_value(value)
+        if value is None:
+            return None
+        return int(value.scaleb(self.decimal_places).to_integral_value(ROUND_HALF_EVEN))
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        if isinstance(value, float):
+            # Non-integral results of aggregates such as Avg (a Decimal on some backends).
+            value = self.context.create_decimal_from_float(value)
+        return Decimal(value).scaleb(-self.decimal_places)
@@ -0,0 +1,93 @@
+from django.db import transaction
+from django.db.models import Q
+from stocks.models import Stock, PortfolioStock
+
+# Batched changes to a portfolio's holdings. Stocks are resolved with one query
+# however many tickers/ids are given, and all writes happen in one transaction.
+
+
+def resolve_stocks(refs):
+    """
+    Map (id, ticker) references to Stock objects with a single query. A
+    reference uses its id when given, its ticker (case-insensitive) otherwise.
+    Returns a list aligned with `refs`, None where no stock matched.
+    """
+    ids = {stock_id for stock_id, _ in refs if stock_id is not None}
+    tickers = {ticker.upper() for stock_id, ticker in refs if stock_id is None and ticker}
+    if not ids and not tickers:
+        return [None] * len(refs)
+    stocks = list(Stock.objects.filter(Q(id__in=ids) | Q(ticker__in=tickers)).only('id', 'ticker'))
+    by_id = {stock.id: stock for stock in stocks}
+    by_ticker = {stock.ticker: stock for stock in stocks}
+    return [
+        by_id.get(stock_id) if stock_id is not None else by_ticker.get((ticker or '').upper())
+        for stock_id, ticker in refs
+    ]
+
+
+def holding_filter(stock_key):
+    # A holding is addressed by its stock: a numeric key is the stock id,
+    # anything else its ticker. Both hit the unique (portfolio, stock) index.
+    if stock_key.isdigit():
+        return {'stock_id': int(stock_key)}
+    return {'stock__ticker': stock_key.upper()}
+
+
+def apply_holdings(portfolio, items):
+    """
+    Add, update or remove many holdings of `portfolio` at once. `items` are
+    validated HoldingItemSerializer data; an item either sets buy_price and
+    shares (creating the holding if needed) or has remove=True.
+
+    Returns one result dict per item, in order, with its status: 'created',
+    'updated', 'removed', or 'error' with a detail message.
+    """
+    stocks = resolve_stocks([(item.get('id'), item.get('ticker')) for item in items])
+    existing = {
+        holding.stock_id: holding
+        for holding in PortfolioStock.objects.filter(
+            portfolio=portfolio, stock_id__in=[stock.id for stock in stocks if stock is not None]
+        )
+    }
+
+    results = []
+    to_create, to_update, to_delete = [], [], []
+    seen = set()
+    for item, stock in zip(items, stocks):
+        result = {'id': item.get('id'), 'ticker': item.get('ticker')}
+        results.append(result)
+        if stock is None:
+            result.update(status='error', detail='Stock not found.')
+            continue
+        result.update(id=stock.id, ticker=stock.ticker)
+        if stock.id in seen:
+            result.update(status='error', detail='Stock appears more than once in the request.')
+            continue
+        seen.add(stock.id)
+
+        holding = existing.get(stock.id)
+        if item['remove']:
+            if holding is None:
+                result.update(status='error', detail='Stock not found in portfolio.')
+            else:
+                to_delete.append(holding.id)
+                result['status'] = 'removed'
+        elif holding is None:
+            to_create.append(PortfolioStock(
+                portfolio=portfolio, stock=stock, buy_price=item['buy_price'], shares=item['shares']
+            ))
+            result['status'] = 'created'
+        else:
+            holding.buy_price = item['buy_price']
+            holding.shares = item['shares']
+            to_update.append(holding)
+            result['status'] = 'updated'
+
+    with transaction.atomic():
+        if to_create:
+            PortfolioStock.objects.bulk_create(to_create)
+        if to_update:
+            PortfolioStock.objects.bulk_update(to_update, ['buy_price', 'shares'])
+        if to_delete:
+            PortfolioStock.objects.filter(id__in=to_delete).delete()
+    return results
@@ -0,0 +1,395 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from django.db.models import Count, Max, Sum
+from stocks.cache import data_generation
+from stocks.models import StockPrice
+from stocks.timeseries import DATE_TEXT, fetch_columns, to_date_array, to_field_array, to_float_array
+
+# Technical indicators over each stock's own trading days (rows without a close
+# price are skipped). Windowed indicators use cumulative sums, so every
+# indicator is O(n) in the number of days whatever its window.
+#
+# Indicators are computed as a stream: fn(inputs, start, state, *params) returns
+# the output columns for rows start.. of `inputs` and the state needed to
+# continue. A full computation is simply start=0 with no state; when an import
+# appends days, only the new rows are computed (see IndicatorSeries.extend).
+
+# Price columns loaded per stock: input name -> StockPrice field.
+INPUT_FIELDS = (
+    ('close', 'close_price'),
+    ('vwap', 'VWAP'),
+    ('volume', 'volume'),
+)
+
+
+def rolling_sum(values, window):
+    # Sum of each trailing window of `window` values, NaN until the window is full.
+    sums = np.full(len(values), np.nan)
+    if len(values) >= window:
+        total = np.cumsum(np.concatenate(([0.0], values)))
+        sums[window - 1:] = total[window:] - total[:-window]
+    return sums
+
+
+def rolling_mean(values, window):
+    # Summed relative to the first value, which keeps the running totals (and
+    # their rounding error) small.
+    if not len(values):
+        return np.array([])
+    return rolling_sum(values - values[0], window) / window + values[0]
+
+
+def rolling_std(values, window):
+    # Population standard deviation, from shifted values as above so the sum of
+    # squares does not swamp the variance.
+    if not len(values):
+        return np.array([])
+    shifted = values - values[0]
+    mean = rolling_sum(shifted, window) / window
+    variance = rolling_sum(shifted * shifted, window) / window - mean * mean
+    return np.sqrt(np.maximum(variance, 0))
+
+
+def ewm(values, alpha, initial):
+    """
+    The recursion e[i] = e[i - 1] + alpha * (values[i] - e[i - 1]) from
+    e[-1] = initial, vectorized with its closed form
+
+        e[k] = d**(k + 1) * (initial + alpha * sum(values[i] / d**(i + 1) for i <= k))
+
+    where d = 1 - alpha. Evaluated in blocks short enough that d**-k stays
+    far from overflow; each block continues from the last value of the previous one.
+    """
+    decay = 1.0 - alpha
+    if decay <= 0:
+        return np.array(values, dtype=np.float64)
+    block = max(int(100 * np.log(10) / -np.log(decay)), 1)
+    result = np.empty(len(values))
+    last = initial
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        powers = decay ** np.arange(1, len(chunk) + 1)
+        result[start:start + len(chunk)] = powers * (last + alpha * np.cumsum(chunk / powers))
+        last = result[start + len(chunk) - 1]
+    return result
+
+
+def window_start(start, window):
+    # First input row a trailing window needs to produce outputs from `start` on.
+    return max(start - window + 1, 0)
+
+
+def sma(inputs, start, state, window):
+    begin = window_start(start, window)
+    return {'': rolling_mean(inputs['close'][begin:], window)[start - begin:]}, None
+
+
+def ema(inputs, start, state, window):
+    # Seeded with the simple average of the first `window` closes; the state is the last value.
+    close = inputs['close']
+    alpha = 2 / (window + 1)
+    if state is not None:
+        values = ewm(close[start:], alpha, state)
+    else:
+        values = np.full(len(close), np.nan)
+        if len(close) >= window:
+            values[window - 1] = close[:window].mean()
+            values[window:] = ewm(close[window:], alpha, values[window - 1])
+        values = values[start:]
+    last = values[-1] if len(values) else state
+    return {'': values}, (None if last is None or np.isnan(last) else last)
+
+
+def rsi(inputs, start, state, window):
+    # Wilder's RSI: average gains and losses are seeded with the mean of the
+    # first `window` changes, then smoothed with alpha = 1 / window. The state
+    # is the last (average gain, average loss).
+    close = inputs['close']
+    alpha = 1 / window
+    if state is not None:
+        changes = np.diff(close[start - 1:])
+        gain = ewm(np.maximum(changes, 0), alpha, state[0])
+        loss = ewm(np.maximum(-changes, 0), alpha, state[1])
+    else:
+        changes = np.diff(close)
+        gain = np.full(len(close), np.nan)
+        loss = np.full(len(close), np.nan)
+        if len(changes) >= window:
+            gains, losses = np.maximum(changes, 0), np.maximum(-changes, 0)
+            gain[window] = gains[:window].mean()
+            loss[window] = losses[:window].mean()
+            gain[window + 1:] = ewm(gains[window:], alpha, gain[window])
+            loss[window + 1:] = ewm(losses[window:], alpha, loss[window])
+        gain, loss = gain[start:], loss[start:]
+    if len(gain) and not np.isnan(gain[-1]):
+        state = (gain[-1], loss[-1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Undefined (NaN) on flat stretches where there are neither gains nor losses.
+        return {'': 100 * gain / (gain + loss)}, state
+
+
+def bollinger(inputs, start, state, window, width):
+    begin = window_start(start, window)
+    close = inputs['close'][begin:]
+    middle = rolling_mean(close, window)
+    spread = width * rolling_std(close, window)
+    cut = start - begin
+    return {'middle': middle[cut:], 'upper': (middle + spread)[cut:], 'lower': (middle - spread)[cut:]}, None
+
+
+def rolling_vwap(inputs, start, state, window):
+    # Volume-weighted average of the daily VWAPs over the window (days missing
+    # either value carry no weight) and the close's relative deviation from it.
+    begin = window_start(start, window)
+    vwap, volume = inputs['vwap'][begin:], inputs['volume'][begin:]
+    known = ~np.isnan(vwap) & ~np.isnan(volume)
+    volume = np.where(known, volume, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        average = rolling_sum(np.where(known, vwap * volume, 0), window) / rolling_sum(volume, window)
+        deviation = inputs['close'][begin:] / average - 1
+    cut = start - begin
+    return {'': average[cut:], 'deviation': deviation[cut:]}, None
+
+
+# name -> (function, default parameters). Parameters are given in the request as
+# name:param:param (e.g. bollinger:20:2) and parsed with the defaults' types.
+INDICATORS = {
+    'sma': (sma, (20,)),
+    'ema': (ema, (20,)),
+    'rsi': (rsi, (14,)),
+    'bollinger': (bollinger, (20, 2.0)),
+    'vwap': (rolling_vwap, (20,)),
+}
+DEFAULT_INDICATORS = 'sma:20,ema:20,rsi:14,bollinger:20:2,vwap:20'
+
+
+def parse_indicators(value):
+    """
+    Parse an indicator list such as "sma:50,rsi,bollinger:20:2" into a tuple
+    of (name, params) specs, in request order without duplicates. Raises
+    ValueError for unknown names or invalid parameters.
+    """
+    specs = []
+    for item in (value or DEFAULT_INDICATORS).split(','):
+        name, *params = item.strip().lower().split(':')
+        if not name:
+            continue
+        if name not in INDICATORS:
+            raise ValueError(f"Unknown indicator '{name}'.")
+        defaults = INDICATORS[name][1]
+        if len(params) > len(defaults):
+            raise ValueError(f"Too many parameters for '{name}'.")
+        try:
+            params = tuple(type(default)(param) for default, param in zip(defaults, params)) + defaults[len(params):]
+        except ValueError:
+            raise ValueError(f"Invalid parameters for '{name}'.")
+        if params[0] < 1 or not all(np.isfinite(params)):
+            raise ValueError(f"Invalid parameters for '{name}'.")
+        if (name, params) not in specs:
+            specs.append((name, params))
+    if not specs:
+        raise ValueError('No indicators requested.')
+    return tuple(specs)
+
+
+def spec_label(spec):
+    # Column prefix for a spec, e.g. ('bollinger', (20, 2.0)) -> 'bollinger_20_2'.
+    name, params = spec
+    return '_'.join([name] + [f'{param:g}' for param in params])
+
+
+def spec_columns(spec, columns):
+    # Response column names of one spec's outputs: the label, or label_<output>.
+    label = spec_label(spec)
+    return {f'{label}_{output}' if output else label: values for output, values in columns.items()}
+
+
+def load_inputs(prices, after=None):
+    """
+    Load the indicator inputs of every stock in a StockPrice queryset with one
+    query. Returns {stock_id: block}, a block being a dict of dates and input
+    arrays (oldest first) plus 'totals': row count and the sums of the raw
+    stored values, which identify the rows for IndicatorStore's change checks.
+    `after` optionally maps stock ids to a date; only later rows are kept.
+    """
+    fields = [field for _, field in INPUT_FIELDS]
+    columns = fetch_columns(
+        prices.filter(close_price__isnull=False).order_by('stock_id', 'date'),
+        ['stock_id', DATE_TEXT] + fields,
+    )
+    ids = np.array(columns[0], dtype=np.int64)
+    dates = to_date_array(columns[1])
+    raw = [to_float_array(values) for values in columns[2:]]
+    values = [to_field_array(StockPrice, field, values) for field, values in zip(fields, columns[2:])]
+    if after:
+        present, index = np.unique(ids, return_inverse=True)
+        cutoffs = np.array([after.get(stock_id, np.datetime64('NaT')) for stock_id in present.tolist()], dtype='datetime64[D]')
+        keep = ~(dates <= cutoffs[index])
+        ids, dates = ids[keep], dates[keep]
+        raw = [column[keep] for column in raw]
+        values = [column[keep] for column in values]
+    if not len(ids):
+        return {}
+    stock_ids, starts = np.unique(ids, return_index=True)
+    ends = np.append(starts[1:], len(ids))
+    blocks = {}
+    for stock_id, start, end in zip(stock_ids.tolist(), starts, ends):
+        block = {'dates': dates[start:end]}
+        for (name, _), column in zip(INPUT_FIELDS, values):
+            block[name] = column[start:end]
+        block['totals'] = (end - start,) + tuple(int(np.nansum(column[start:end])) for column in raw)
+        blocks[stock_id] = block
+    return blocks
+
+
+def input_totals(stock_ids):
+    # The same totals as load_inputs() computed by the database, plus each stock's last date.
+    fields = [field for _, field in INPUT_FIELDS]
+    prices = (
+        StockPrice.objects.filter(stock_id__in=stock_ids, close_price__isnull=False)
+        .values('stock_id').order_by()
+        .annotate(rows=Count('id'), last=Max('date'), **{f'total_{field}': Sum(field) for field in fields})
+    )
+    columns = fetch_columns(prices, ['stock_id', 'rows'] + [f'total_{field}' for field in fields] + ['last'])
+    last_dates = to_date_array(columns[-1])
+    return {
+        stock_id: (tuple(int(value or 0) for value in totals), last)
+        for stock_id, *totals, last in zip(*columns[:-1], last_dates)
+    }
+
+
+class IndicatorSeries:
+    """
+    One stock's inputs over its trading days and the indicators computed on
+    them so far, each kept with its stream state so new days can be appended
+    without recomputing the history.
+    """
+
+    def __init__(self, block, generation):
+        self.generation = generation
+        self.dates = block['dates']
+        self.inputs = {name: block[name] for name, _ in INPUT_FIELDS}
+        self.totals = block['totals']
+        self.results = {}
+
+    def __len__(self):
+        return len(self.dates)
+
+    def last_date(self):
+        return self.dates[-1] if len(self.dates) else np.datetime64('NaT')
+
+    def indicator(self, spec):
+        # The full output columns of a spec, computed on first use.
+        if spec not in self.results:
+            name, params = spec
+            self.results[spec] = INDICATORS[name][0](self.inputs, 0, None, *params)
+        return self.results[spec][0]
+
+    def extend(self, block):
+        # Append newer days and compute only their rows of every cached indicator.
+        start = len(self.dates)
+        self.dates = np.concatenate((self.dates, block['dates']))
+        self.inputs = {name: np.concatenate((values, block[name])) for name, values in self.inputs.items()}
+        self.totals = tuple(total + added for total, added in zip(self.totals, block['totals']))
+        for (name, params), (columns, state) in self.results.items():
+            added, state = INDICATORS[name][0](self.inputs, start, state, *params)
+            columns = {output: np.concatenate((columns[output], added[output])) for output in columns}
+            self.results[(name, params)] = (columns, state)
+
+
+class IndicatorStore:
+    """
+    Per-process, least-recently-used cache of IndicatorSeries by stock id.
+
+    After an import (a new market data generation) cached series are checked
+    against the database with one grouped query: unchanged series are kept,
+    series whose only change is newer days are extended with those rows, and
+    anything else (rewritten or deleted rows) is reloaded in full.
+    """
+    max_stocks = 500
+
+    def __init__(self):
+        self.series = OrderedDict()
+        self.lock = threading.Lock()
+
+    def compute(self, stock_ids, specs):
+        """
+        Return {stock_id: (dates, inputs, columns)} for the given stock ids,
+        columns mapping response column names (see spec_columns) to arrays
+        over all of the stock's trading days.
+        """
+        generation = data_generation()
+        with self.lock:
+            self.refresh(stock_ids, generation)
+            results = {}
+            for stock_id in stock_ids:
+                series = self.series[stock_id]
+                self.series.move_to_end(stock_id)
+                columns = {}
+                for spec in specs:
+                    columns.update(spec_columns(spec, series.indicator(spec)))
+                results[stock_id] = (series.dates, series.inputs, columns)
+            while len(self.series) > max(self.max_stocks, len(stock_ids)):
+                self.series.popitem(last=False)
+        return results
+
+    def refresh(self, stock_ids, generation):
+        missing = [stock_id for stock_id in stock_ids if stock_id not in self.series]
+        stale = [
+            stock_id for stock_id in stock_ids
+            if stock_id in self.series and self.series[stock_id].generation != generation
+        ]
+        if stale:
+            current = input_totals(stale)
+            appended = []
+            for stock_id in stale:
+                series = self.series[stock_id]
+                totals, last = current.get(stock_id, ((0,) * (len(INPUT_FIELDS) + 1), np.datetime64('NaT')))
+                if totals == series.totals:
+                    series.generation = generation
+                elif len(series) and totals[0] > len(series) and last > series.last_date():
+                    appended.append(stock_id)
+                else:
+                    missing.append(stock_id)
+            if appended:
+                # One query from the earliest of their last dates; older rows of the others are dropped.
+                after = {stock_id: self.series[stock_id].last_date() for stock_id in appended}
+                since = min(after.values()).item()
+                blocks = load_inputs(StockPrice.objects.filter(stock_id__in=appended, date__gt=since), after)
+                for stock_id in appended:
+                    series = self.series[stock_id]
+                    block = blocks.get(stock_id) or empty_block()
+                    if tuple(map(sum, zip(series.totals, block['totals']))) != current[stock_id][0]:
+                        # Older rows changed as well.
+                        missing.append(stock_id)
+                        continue
+                    series.extend(block)
+                    series.generation = generation
+        if missing:
+            blocks = load_inputs(StockPrice.objects.filter(stock_id__in=missing))
+            for stock_id in missing:
+                self.series[stock_id] = IndicatorSeries(blocks.get(stock_id) or empty_block(), generation)
+
+
+def empty_block():
+    block = {'dates': np.array([], dtype='datetime64[D]')}
+    for name, _ in INPUT_FIELDS:
+        block[name] = np.array([])
+    block['totals'] = (0,) * (len(INPUT_FIELDS) + 1)
+    return block
+
+
+_store = IndicatorStore()
+
+
+def indicator_store():
+    # The process-wide IndicatorStore.
+    return _store
+
+
+def date_rows(dates, start=None, end=None):
+    # Slice of the sorted `dates` between the inclusive date bounds.
+    low = np.searchsorted(dates, np.datetime64(start, 'D'), 'left') if start else 0
+    high = np.searchsorted(dates, np.datetime64(end, 'D'), 'right') if end else len(dates)
+    return slice(low, high)
@@ -0,0 +1,268 @@
+import csv
+import hashlib
+import os
+from datetime import date, datetime
+from itertools import islice
+from decimal import Decimal, InvalidOperation
+
+# Helpers shared by the CSV import command. This module deliberately does not
+# import any Django models so it can be loaded by process-pool workers that
+# never configure Django.
+
+# StockPrice field name -> CSV column, in the order parsed values are stored.
+PRICE_COLUMNS = (
+    ('prev_close_price', 'Prev Close'),
+    ('open_price', 'Open'),
+    ('high_price', 'High'),
+    ('last_price', 'Last'),
+    ('low_price', 'Low'),
+    ('close_price', 'Close'),
+    ('VWAP', 'VWAP'),
+)
+PRICE_FIELDS = tuple(field for field, _ in PRICE_COLUMNS) + ('volume',)
+
+
+def to_decimal(val):
+    if val is None:
+        return None
+    val = val.strip()
+    if val == '':
+        return None
+    try:
+        return Decimal(val.replace(',', ''))  # remove commas if any
+    except InvalidOperation:
+        return None
+
+
+def to_int(val):
+    # Volumes are plain integers; only values like "1,234" or "12.0" go through Decimal.
+    try:
+        return int(val)
+    except (TypeError, ValueError):
+        pass
+    value = to_decimal(val)
+    if value is None:
+        return None
+    return int(value)
+
+
+def to_date(val):
+    # Dates as datetime.strptime(val, '%Y-%m-%d') reads them, unpadded ones such as
+    # "2023-1-5" included; fromisoformat() is the fast path for the padded form.
+    if len(val) == 10 and val[4] == val[7] == '-':
+        return date.fromisoformat(val)
+    return datetime.strptime(val, '%Y-%m-%d').date()
+
+
+def threshold_for(max_date):
+    # Keep data with date on or after January 1 of (max_date.year - 1).
+    if max_date is None:
+        return None
+    return date(max_date.year - 1, 1, 1)
+
+
+def default_ticker_for(csv_file):
+    # The file name (without extension) is the ticker when Symbol is not provided.
+    return os.path.splitext(os.path.basename(csv_file))[0].upper()
+
+
+def file_sha256(csv_file, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(csv_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_last_date(csv_file, date_index, block_size=8192):
+    """
+    Return the date of the last row with a valid date by reading the file
+    backwards in blocks, or None if no row has one.
+
+    Dataset files are in date order (as exported and as written by
+    pre_process.py), so this is the maximum date without scanning the file.
+    """
+    with open(csv_file, 'rb') as f:
+        pos = f.seek(0, os.SEEK_END)
+        tail = b''
+        while pos > 0:
+            size = min(block_size, pos)
+            pos -= size
+            f.seek(pos)
+            lines = (f.read(size) + tail).splitlines()
+            # Unless we reached the start of the file, the first line may be partial.
+            tail = lines.pop(0) if pos > 0 and lines else b''
+            for line in reversed(lines):
+                try:
+                    row = next(csv.reader([line.decode('utf-8')]))
+                    return to_date(row[date_index].strip())
+                except (IndexError, StopIteration, UnicodeDecodeError, ValueError):
+                    continue
+    return None
+
+
+def iter_price_rows(csv_file, default_ticker, since=None, warnings=None):
+    """
+    Stream the rows of one per-ticker CSV file in a single pass.
+
+    Yields (ticker, date, values) tuples where values follows PRICE_FIELDS.
+    Only rows inside the two-calendar-year window of the file are yielded.
+    `since` optionally maps a ticker to an ISO date string; rows on or before
+    that date are skipped. Warnings are appended to `warnings` if given.
+    """
+    since = since or {}
+    if warnings is None:
+        warnings = []
+    with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = [column.strip() for column in next(reader, [])]
+        if 'Date' not in header:
+            raise ValueError(f"File {csv_file} has no Date column.")
+
+        def index_of(column):
+            return header.index(column) if column in header else None
+
+        def cell(row, index):
+            return row[index] if index is not None and index < len(row) else None
+
+        date_index = index_of('Date')
+        symbol_index = index_of('Symbol')
+        value_indexes = [index_of(column) for _, column in PRICE_COLUMNS]
+        volume_index = index_of('Volume')
+
+        max_date = read_last_date(csv_file, date_index)
+        threshold_date = threshold_for(max_date)
+        # Well-formed ISO dates compare correctly as strings, so old rows skip all parsing.
+        threshold = threshold_date.isoformat() if threshold_date else ''
+        reported_order = False
+
+        for row in reader:
+            if not row:
+                continue
+            date_str = (cell(row, date_index) or '').strip()
+            well_formed = len(date_str) == 10
+            if well_formed and date_str < threshold:
+                continue
+            ticker = (cell(row, symbol_index) or '').strip() or default_ticker
+            last_date = since.get(ticker)
+            if well_formed and last_date and date_str <= last_date:
+                continue
+            try:
+                row_date = to_date(date_str)
+            except ValueError:
+                warnings.append(f"Skipping row with invalid date: {date_str} in file {csv_file}")
+                continue
+            if threshold_date and row_date < threshold_date:
+                continue
+            if max_date and row_date > max_date and not reported_order:
+                warnings.append(f"File {csv_file} is not in date order; the date window may be off.")
+                reported_order = True
+
+            values = tuple(to_decimal(cell(row, index)) for index in value_indexes)
+            yield ticker, row_date, values + (to_int(cell(row, volume_index)),)
+
+
+def iter_price_rows_pandas(csv_file, default_ticker, since=None, warnings=None, chunk_size=50000):
+    """
+    Vectorized equivalent of iter_price_rows built on pandas.
+
+    The file is read in chunks with typed columns (the C parser strips
+    thousands separators), dates are parsed, windowed and compared with
+    `since` as arrays, and only the surviving rows are converted to Python
+    values. Yields the same (ticker, date, values) tuples, with floats in
+    place of Decimals.
+    """
+    import pandas as pd  # only needed for --engine pandas
+
+    since = since or {}
+    if warnings is None:
+        warnings = []
+    with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+        header = [column.strip() for column in next(csv.reader(f), [])]
+    if 'Date' not in header:
+        raise ValueError(f"File {csv_file} has no Date column.")
+
+    max_date = read_last_date(csv_file, header.index('Date'))
+    threshold_date = threshold_for(max_date)
+    value_columns = [column for _, column in PRICE_COLUMNS] + ['Volume']
+    usecols = [column for column in ['Date', 'Symbol'] + value_columns if column in header]
+    reported_order = False
+
+    chunks = pd.read_csv(
+        csv_file, header=0, names=header, usecols=usecols,
+        dtype={'Date': str, 'Symbol': str}, keep_default_na=False, na_values=[''],
+        thousands=',', encoding='utf-8', chunksize=chunk_size,
+    )
+    for chunk in chunks:
+        date_str = chunk['Date'].fillna('')
+        dates = pd.to_datetime(date_str, format='%Y-%m-%d', errors='coerce')
+        if dates.isna().any():
+            # Retry padded values before reporting them as invalid.
+            retry = dates.isna()
+            dates[retry] = pd.to_datetime(date_str[retry].str.strip(), format='%Y-%m-%d', errors='coerce')
+            for bad in date_str[dates.isna()]:
+                warnings.append(f"Skipping row with invalid date: {bad.strip()} in file {csv_file}")
+        keep = dates.notna()
+        if threshold_date:
+            keep &= dates >= pd.Timestamp(threshold_date)
+        if max_date and not reported_order and (dates > pd.Timestamp(max_date)).any():
+            warnings.append(f"File {csv_file} is not in date order; the date window may be off.")
+            reported_order = True
+        if not keep.any():
+            continue
+
+        chunk = chunk[keep]
+        dates = dates[keep]
+        if 'Symbol' in chunk:
+            tickers = chunk['Symbol'].fillna('').str.strip()
+            tickers = tickers.mask(tickers == '', default_ticker)
+        else:
+            tickers = pd.Series(default_ticker, index=chunk.index)
+        if since:
+            cutoffs = pd.to_datetime(tickers.map(since), format='%Y-%m-%d')
+            recent = (cutoffs.isna() | (dates > cutoffs)).to_numpy()
+            chunk, dates, tickers = chunk[recent], dates[recent], tickers[recent]
+            if chunk.empty:
+                continue
+
+        columns = []
+        for column in value_columns:
+            if column not in chunk:
+                columns.append([None] * len(chunk))
+                continue
+            values = chunk[column]
+            if not pd.api.types.is_numeric_dtype(values):
+                # Malformed cells defeat the typed parse (leaving object or, on pandas 3,
+                # string columns); coerce them to missing.
+                values = pd.to_numeric(values.str.replace(',', '', regex=False).str.strip(), errors='coerce')
+            columns.append(values.astype(object).where(values.notna(), None).tolist())
+        columns[-1] = [None if volume is None else int(volume) for volume in columns[-1]]
+
+        yield from zip(tickers.tolist(), dates.dt.date.tolist(), zip(*columns))
+
+
+# Row parsers selectable with import_all_csv --engine.
+ENGINES = {
+    'csv': iter_price_rows,
+    'pandas': iter_price_rows_pandas,
+}
+
+
+def parse_file_job(csv_file, since=None, engine='csv'):
+    # Process-pool entry point: never raises so the writer can report errors in order.
+    warnings = []
+    try:
+        rows = list(ENGINES[engine](csv_file, default_ticker_for(csv_file), since, warnings))
+    except Exception as e:
+        return csv_file, [], warnings, e
+    return csv_file, rows, warnings, None
+
+
+def batched(rows, batch_size):
+    # Works on any iterable, so streamed rows are never fully materialized.
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
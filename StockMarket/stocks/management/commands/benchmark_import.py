@@ -0,0 +1,81 @@
+import os
+import glob
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from stocks.ingest import ENGINES, default_ticker_for
+
+class Command(BaseCommand):
+    help = 'Compare the CSV parsing engines of import_all_csv on a dataset folder without touching the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'dataset_path',
+            type=str,
+            help='Path to the folder containing CSV files'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Number of timed runs per engine; the best run is reported (default: 3)'
+        )
+
+    def handle(self, *args, **options):
+        dataset_path = options['dataset_path']
+        repeat = options['repeat']
+
+        if not os.path.isdir(dataset_path):
+            raise CommandError(f"Directory '{dataset_path}' does not exist or is not a directory.")
+        if repeat < 1:
+            raise CommandError("--repeat must be a positive integer.")
+
+        csv_files = [
+            csv_file for csv_file in sorted(glob.glob(os.path.join(dataset_path, '*.csv')))
+            if default_ticker_for(csv_file) != 'STOCK_METADATA'
+        ]
+        if not csv_files:
+            raise CommandError("No CSV files found in the provided dataset directory.")
+
+        results = {}
+        for name, engine in sorted(ENGINES.items()):
+            try:
+                timings = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    rows = [row for csv_file in csv_files for row in engine(csv_file, default_ticker_for(csv_file))]
+                    timings.append(time.perf_counter() - started)
+            except ImportError as e:
+                self.stdout.write(self.style.WARNING(f"Skipping engine {name}: {e}"))
+                continue
+            results[name] = rows
+            best = min(timings)
+            self.stdout.write(
+                f"{name:>8}: {len(rows)} rows from {len(csv_files)} files in {best:.3f}s "
+                f"({len(rows) / best:,.0f} rows/s, best of {repeat})"
+            )
+
+        if len(results) > 1:
+            (base_name, base_rows), *others = sorted(results.items())
+            for name, rows in others:
+                if same_rows(base_rows, rows):
+                    self.stdout.write(self.style.SUCCESS(f"{name} output matches {base_name}."))
+                else:
+                    self.stdout.write(self.style.ERROR(f"{name} output differs from {base_name}."))
+
+
+def same_value(a, b):
+    if a is None or b is None:
+        return a is b
+    # Engines may yield floats instead of Decimals; compare the decimal values.
+    return Decimal(repr(a) if isinstance(a, float) else a) == Decimal(repr(b) if isinstance(b, float) else b)
+
+
+def same_rows(a, b):
+    if len(a) != len(b):
+        return False
+    return all(
+        row_a[0] == row_b[0] and row_a[1] == row_b[1]
+        and all(same_value(x, y) for x, y in zip(row_a[2], row_b[2]))
+        for row_a, row_b in zip(a, b)
+    )
@@ -0,0 +1,123 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Min, Max
+from stocks.models import Stock, StockPrice
+from stocks.search import prefix_search
+
+# Indexes added by migration 0006, dropped for the "before" measurements.
+INDEXES = (
+    (Stock, 'stock_industry_ticker_idx'),
+    (Stock, 'stock_company_upper_idx'),
+    (StockPrice, 'price_stock_date_close_idx'),
+    (StockPrice, 'price_date_stock_idx'),
+)
+
+class Command(BaseCommand):
+    help = ('Show the query plans and timings of the main read queries with and without the '
+            'stock/price indexes. Runs in a transaction that is rolled back, so nothing is changed.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Timed runs per query; the best run is reported (default: 5)'
+        )
+        parser.add_argument(
+            '--scale',
+            type=int,
+            default=0,
+            help='Add this many shifted copies of the price history first, for a larger dataset (default: 0)'
+        )
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        if repeat < 1:
+            raise CommandError("--repeat must be a positive integer.")
+        stock = Stock.objects.filter(prices__isnull=False).order_by('ticker').first()
+        if stock is None:
+            raise CommandError("No price data; run import_all_csv first.")
+
+        with transaction.atomic():
+            if options['scale'] > 0:
+                self.scale_prices(options['scale'])
+            self.stdout.write(f"Price rows: {StockPrice.objects.count()}")
+            queries = self.queries(stock)
+            after = {name: self.measure(queryset, repeat, 'after') for name, queryset in queries}
+            self.drop_indexes()
+            before = {name: self.measure(queryset, repeat, 'before') for name, queryset in queries}
+            transaction.set_rollback(True)
+
+        for name, _ in queries:
+            (plan_before, time_before), (plan_after, time_after) = before[name], after[name]
+            speedup = time_before / time_after if time_after > 0 else float('inf')
+            self.stdout.write(self.style.SUCCESS(
+                f"\n{name}: {time_before * 1000:.2f}ms -> {time_after * 1000:.2f}ms ({speedup:.1f}x)"
+            ))
+            self.stdout.write(f"  before: {plan_before}")
+            self.stdout.write(f"  after:  {plan_after}")
+
+    def queries(self, stock):
+        latest = StockPrice.objects.filter(stock=stock).aggregate(date=Max('date'))['date']
+        month_ago = latest - timedelta(days=30)
+        return [
+            ('latest 20 closes of one stock',
+             StockPrice.objects.filter(stock=stock).order_by('-date').values_list('date', 'close_price')[:20]),
+            ('close at or before a date',
+             StockPrice.objects.filter(stock=stock, date__lte=month_ago).order_by('-date').values_list('close_price')[:1]),
+            ('last month of prices, all stocks (cursor order)',
+             StockPrice.objects.filter(date__gte=month_ago).order_by('-date', 'stock_id')[:100]),
+            ('close matrix since a date (risk, analytics)',
+             StockPrice.objects.filter(date__gte=month_ago).order_by().values_list('date', 'stock_id', 'close_price')),
+            ('stocks of one industry',
+             Stock.objects.filter(industry=stock.industry).order_by('ticker')),
+            ('ticker/company prefix search',
+             prefix_search(Stock.objects.all(), stock.ticker[:3])),
+        ]
+
+    def measure(self, queryset, repeat, tag):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            # The tag keeps SQLite from reusing an EXPLAIN statement prepared before
+            # the indexes were dropped (its plan would be stale).
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql} /* {tag} */', params)
+            plan = ' | '.join(str(row[-1]) for row in cursor.fetchall())
+        list(queryset.all())  # warm-up
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(queryset.all())
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return plan, best
+
+    def drop_indexes(self):
+        # The backend's own DROP INDEX template, executed directly rather than through
+        # the schema editor (which manages its own transaction), so it is rolled back.
+        editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for model, name in INDEXES:
+                cursor.execute(editor.sql_delete_index % {
+                    'name': editor.quote_name(name),
+                    'table': editor.quote_name(model._meta.db_table),
+                })
+
+    def scale_prices(self, copies):
+        # Copies shifted back by whole weeks beyond the current date span, so
+        # (stock, date) stays unique and weekdays are preserved.
+        span = StockPrice.objects.aggregate(first=Min('date'), last=Max('date'))
+        shift = timedelta(days=((span['last'] - span['first']).days // 7 + 1) * 7)
+        fields = [field.attname for field in StockPrice._meta.concrete_fields if not field.primary_key]
+        rows = list(StockPrice.objects.values_list(*fields))
+        date_index = fields.index('date')
+        for copy in range(1, copies + 1):
+            StockPrice.objects.bulk_create(
+                (
+                    StockPrice(**dict(zip(fields, row), date=row[date_index] - shift * copy))
+                    for row in rows
+                ),
+                batch_size=1000,
+            )
+
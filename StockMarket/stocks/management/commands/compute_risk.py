@@ -0,0 +1,63 @@
+import csv
+import time
+from django.core.management.base import BaseCommand, CommandError
+from stocks.models import StockPrice
+from django.utils.dateparse import parse_date
+from stocks.risk import METRICS, risk_table
+
+class Command(BaseCommand):
+    help = 'Compute volatility, Sharpe ratio, max drawdown and risk score for all (or selected) tickers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'tickers',
+            nargs='*',
+            help='Tickers to include (default: all)'
+        )
+        parser.add_argument(
+            '--from',
+            dest='date_from',
+            help='First price date to use (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--to',
+            dest='date_to',
+            help='Last price date to use (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--output',
+            help='Write the results to this CSV file instead of printing them'
+        )
+
+    def handle(self, *args, **options):
+        prices = StockPrice.objects.all()
+        for option, lookup in (('date_from', 'date__gte'), ('date_to', 'date__lte')):
+            if options[option]:
+                try:
+                    value = parse_date(options[option])
+                except ValueError:
+                    value = None
+                if value is None:
+                    raise CommandError(f"Invalid date '{options[option]}', expected YYYY-MM-DD.")
+                prices = prices.filter(**{lookup: value})
+        if options['tickers']:
+            prices = prices.filter(stock__ticker__in=[ticker.upper() for ticker in options['tickers']])
+
+        started = time.perf_counter()
+        rows = risk_table(prices)
+        elapsed = time.perf_counter() - started
+        columns = ['ticker', *METRICS, 'risk_score', 'observations']
+
+        if options['output']:
+            with open(options['output'], 'w', newline='') as file:
+                writer = csv.DictWriter(file, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            for row in rows:
+                self.stdout.write(' '.join(
+                    f'{name}={row[name]:.4f}' if isinstance(row[name], float) else f'{name}={row[name]}'
+                    for name in columns
+                ))
+
+        self.stdout.write(self.style.SUCCESS(f"Computed risk metrics for {len(rows)} tickers in {elapsed:.3f}s."))
@@ -1,10 +1,19 @@
 import os
 import csv
 import glob
-from datetime import datetime, timedelta
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from django.core.management.base import BaseCommand, CommandError
-from stocks.models import Stock, StockPrice
-from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.db.models import Q
+from stocks.models import Stock, StockPrice, ImportedFile
+from stocks.snapshots import rebuild_snapshots
+from stocks.risk import rebuild_risk_metrics
+from stocks.cache import bump_generation
+from stocks.ingest import (
+    ENGINES, PRICE_FIELDS, batched, default_ticker_for, file_sha256, parse_file_job,
+)
 
 class Command(BaseCommand):
     help = 'Import stock and historical price data from all CSV files in a given dataset folder, limiting to the last two calendar years in each CSV file'
@@ -15,140 +24,229 @@ class Command(BaseCommand):
             type=str,
             help='Path to the folder containing CSV files'
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of price rows written per bulk upsert (default: 1000)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of processes used to parse CSV files; the database is always written by this process (default: 1)'
+        )
+        parser.add_argument(
+            '--engine',
+            choices=sorted(ENGINES),
+            default='csv',
+            help='Row parser: the streaming csv module parser or the vectorized pandas loader (default: csv)'
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Skip files unchanged since the last import and only write rows newer than each stock\'s last imported date'
+        )
 
     def handle(self, *args, **options):
         dataset_path = options['dataset_path']
+        batch_size = options['batch_size']
+        workers = options['workers']
+        incremental = options['incremental']
+        engine = options['engine']
 
         if not os.path.isdir(dataset_path):
             raise CommandError(f"Directory '{dataset_path}' does not exist or is not a directory.")
-        
-        # Reading metadata from stock_metadata.csv
-        metadata_file = os.path.join(dataset_path, 'stock_metadata.csv')
-        try:
-            with open(metadata_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    ticker = row.get('Symbol', '').strip()
-                    company_name = row.get('Company Name', '').strip()
-                    series = row.get('Series', '').strip() or "EQ"
-                    industry = row.get('Industry', '').strip()
-
-                    # Get or create the Stock record.
-                    stock_obj, created = Stock.objects.get_or_create(
-                        ticker=ticker,
-                        defaults={'company_name': company_name, 'series': series, 'industry': industry}
-                    )
-                    if not created:
-                        stock_obj.company_name = company_name
-                        stock_obj.series = series
-                        stock_obj.save()
-        except FileNotFoundError:
-            self.stdout.write(self.style.WARNING(f"Metadata file '{metadata_file}' not found. Skipping metadata import."))
+        if batch_size < 1:
+            raise CommandError("--batch-size must be a positive integer.")
+        if workers < 1:
+            raise CommandError("--workers must be a positive integer.")
+        if engine == 'pandas':
+            try:
+                import pandas  # noqa: F401
+            except ImportError:
+                raise CommandError("--engine pandas requires pandas to be installed.")
+
+        self.import_metadata(os.path.join(dataset_path, 'stock_metadata.csv'))
 
         # Find all CSV files in the directory.
-        csv_files = glob.glob(os.path.join(dataset_path, '*.csv'))
+        csv_files = sorted(glob.glob(os.path.join(dataset_path, '*.csv')))
         if not csv_files:
             self.stdout.write(self.style.WARNING("No CSV files found in the provided dataset directory."))
             return
 
-        total_records = 0
+        # Resolve every ticker once instead of querying Stock for each row.
+        stock_ids = dict(Stock.objects.values_list('ticker', 'id'))
 
-        # Process each CSV file.
-        for csv_file in csv_files:
+        total_records = 0
+        updated_stocks = set()
+        started = time.perf_counter()
+
+        # stock_metadata.csv was handled above and holds no prices.
+        price_files = [
+            csv_file for csv_file in csv_files
+            if default_ticker_for(csv_file) != 'STOCK_METADATA'
+        ]
+
+        fingerprints = {csv_file: self.fingerprint(csv_file) for csv_file in price_files}
+        since = None
+        if incremental:
+            price_files = self.changed_files(fingerprints)
+            since = {
+                ticker: last_date.isoformat()
+                for ticker, last_date in Stock.objects.filter(last_imported_date__isnull=False)
+                                                     .values_list('ticker', 'last_imported_date')
+            }
+            skipped = len(fingerprints) - len(price_files)
+            self.stdout.write(f"Incremental import: {len(price_files)} changed files, {skipped} unchanged files skipped.")
+
+        # Files are parsed (possibly in parallel) but written here, one at a time,
+        # in sorted order so runs are deterministic and SQLite has a single writer.
+        for csv_file, rows, warnings, error in self.parse_files(price_files, workers, since, engine):
             self.stdout.write(self.style.SUCCESS(f"Processing file: {csv_file}"))
-
-            # Use the file name (without extension) as the default ticker if Symbol is not provided.
-            ticker_from_filename = os.path.splitext(os.path.basename(csv_file))[0].upper()
-            if ticker_from_filename == 'STOCK_METADATA':
-                continue
-
             try:
-                with open(csv_file, 'r', encoding='utf-8') as f:
-                    reader = csv.DictReader(f)
-                    rows = list(reader)
-
-                    # Determine the maximum date available in this CSV file.
-                    max_date = None
-                    for row in rows:
-                        date_str = row.get('Date', '').strip()
-                        try:
-                            d = datetime.strptime(date_str, '%Y-%m-%d').date()
-                            if (max_date is None) or (d > max_date):
-                                max_date = d
-                        except ValueError:
-                            # skip invalid dates while finding max_date
-                            continue
-
-                    # Calculate threshold: If max_date exists then keep data with date 
-                    # on or after January 1 of (max_date.year - 1)
-                    threshold_date = None
-                    if max_date:
-                        threshold_date = datetime(max_date.year - 1, 1, 1).date()
-
-                    for row in rows:
-                        # Map CSV columns to Stock model fields.
-                        ticker = row.get('Symbol', '').strip() or ticker_from_filename
-
-                        # Get the corresponding Stock object (assumes it already exists)
-                        stock_obj = Stock.objects.get(ticker=ticker)
-
-                        # Parse the Date column (assumes format 'YYYY-MM-DD').
-                        date_str = row.get('Date', '').strip()
-                        try:
-                            date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                        except ValueError:
-                            self.stdout.write(
-                                self.style.WARNING(f"Skipping row with invalid date: {date_str} in file {csv_file}")
-                            )
-                            continue
-
-                        # Skip rows older than the calculated threshold for this CSV (if threshold was determined).
-                        if threshold_date and date < threshold_date:
-                            continue
-
-                        def to_decimal(val):
-                            if val is None:
-                                return None
-                            val = val.strip()
-                            if val == '':
-                                return None
-                            try:
-                                return Decimal(val.replace(',', ''))  # remove commas if any
-                            except InvalidOperation:
-                                print(f"Invalid decimal value: {val} in file {csv_file} on date {date_str}")
-                                return None
-
-                        try:
-                            # Map CSV columns to the StockPrice model fields.
-                            stock_price_data = {
-                                'prev_close_price': to_decimal(row.get('Prev Close')),
-                                'open_price': to_decimal(row.get('Open')),
-                                'high_price': to_decimal(row.get('High')),
-                                'last_price': to_decimal(row.get('Last')),
-                                'low_price': to_decimal(row.get('Low')),
-                                'close_price': to_decimal(row.get('Close')),
-                                'VWAP': to_decimal(row.get('VWAP')),
-                                'volume': to_decimal(row.get('Volume')),
-                            }
-                        except Exception as e:
-                            self.stdout.write(
-                                self.style.WARNING(f"Error converting numeric values on {date_str} in file {csv_file}: {e}")
-                            )
-                            continue
-
-                        # Create or update the StockPrice record.
-                        StockPrice.objects.update_or_create(
-                            stock=stock_obj,
-                            date=date,
-                            defaults=stock_price_data
-                        )
-                        total_records += 1
-
+                if error is not None:
+                    raise error
+                # Prices, high-water marks and the file fingerprint commit together.
+                with transaction.atomic():
+                    written, last_dates = self.write_rows(csv_file, rows, stock_ids, batch_size)
+                    self.record_import(csv_file, fingerprints[csv_file], last_dates)
+                total_records += written
+                updated_stocks.update(last_dates)
             except Exception as e:
                 self.stdout.write(self.style.WARNING(f"Error processing file {csv_file}: {e}"))
-                # Optionally print detailed error info.
-                print(f"❌ Error in row: {row}")
-
+            # Streamed rows only report warnings once the file has been consumed.
+            for warning in warnings:
+                self.stdout.write(self.style.WARNING(warning))
+
+        # Refresh price snapshots for stocks that got new rows or never had one.
+        stale = updated_stocks | set(Stock.objects.filter(snapshot__isnull=True).values_list('id', flat=True))
+        if stale:
+            rebuilt = rebuild_snapshots(stale)
+            self.stdout.write(f"Rebuilt price snapshots for {rebuilt} stocks.")
+
+        # Same for risk metrics, which depend on the full price history of a stock.
+        stale = updated_stocks | set(Stock.objects.filter(risk_metrics__isnull=True).values_list('id', flat=True))
+        if stale:
+            rebuilt = rebuild_risk_metrics(stale)
+            self.stdout.write(f"Rebuilt risk metrics for {rebuilt} stocks.")
+
+        # Metadata is re-applied on every run, so always invalidate cached market data.
+        bump_generation()
+
+        elapsed = time.perf_counter() - started
         self.stdout.write(self.style.SUCCESS(
             f"Successfully processed {len(csv_files)} files and imported {total_records} records."
-        ))
\ No newline at end of file
+        ))
+        rate = total_records / elapsed if elapsed > 0 else 0.0
+        self.stdout.write(f"Imported {total_records} records in {elapsed:.2f}s ({rate:,.0f} rows/s).")
+
+    def parse_files(self, csv_files, workers, since=None, engine='csv'):
+        # Yields (csv_file, rows, warnings, error) in the order of csv_files.
+        if workers == 1:
+            # Rows are streamed straight into the writer with bounded memory.
+            for csv_file in csv_files:
+                warnings = []
+                rows = ENGINES[engine](csv_file, default_ticker_for(csv_file), since, warnings)
+                yield csv_file, rows, warnings, None
+            return
+        # Workers return each file's windowed rows in one piece.
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield from pool.map(partial(parse_file_job, since=since, engine=engine), csv_files)
+
+    def fingerprint(self, csv_file):
+        # The content hash is computed lazily; size and mtime are usually enough.
+        stat = os.stat(csv_file)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': None}
+
+    def changed_files(self, fingerprints):
+        known = {
+            record.file_name: record
+            for record in ImportedFile.objects.filter(
+                file_name__in=[os.path.basename(csv_file) for csv_file in fingerprints]
+            )
+        }
+        changed = []
+        for csv_file, fingerprint in fingerprints.items():
+            record = known.get(os.path.basename(csv_file))
+            if record is None:
+                changed.append(csv_file)
+                continue
+            if record.size == fingerprint['size'] and record.mtime == fingerprint['mtime']:
+                continue
+            fingerprint['sha256'] = file_sha256(csv_file)
+            if fingerprint['sha256'] == record.sha256:
+                # Touched but identical: remember the new mtime and move on.
+                record.size = fingerprint['size']
+                record.mtime = fingerprint['mtime']
+                record.save(update_fields=['size', 'mtime'])
+                continue
+            changed.append(csv_file)
+        return changed
+
+    def record_import(self, csv_file, fingerprint, last_dates):
+        for stock_id, last_date in last_dates.items():
+            Stock.objects.filter(
+                Q(last_imported_date__isnull=True) | Q(last_imported_date__lt=last_date),
+                id=stock_id,
+            ).update(last_imported_date=last_date)
+        ImportedFile.objects.update_or_create(
+            file_name=os.path.basename(csv_file),
+            defaults={
+                'size': fingerprint['size'],
+                'mtime': fingerprint['mtime'],
+                'sha256': fingerprint['sha256'] or file_sha256(csv_file),
+            },
+        )
+
+    def import_metadata(self, metadata_file):
+        # Reading metadata from stock_metadata.csv
+        try:
+            with open(metadata_file, 'r', encoding='utf-8') as f:
+                stocks = [
+                    Stock(
+                        ticker=row.get('Symbol', '').strip(),
+                        company_name=row.get('Company Name', '').strip(),
+                        series=row.get('Series', '').strip() or "EQ",
+                        industry=row.get('Industry', '').strip(),
+                    )
+                    for row in csv.DictReader(f)
+                ]
+        except FileNotFoundError:
+            self.stdout.write(self.style.WARNING(f"Metadata file '{metadata_file}' not found. Skipping metadata import."))
+            return
+
+        # Existing stocks keep their industry; only name and series are refreshed.
+        Stock.objects.bulk_create(
+            stocks,
+            update_conflicts=True,
+            unique_fields=['ticker'],
+            update_fields=['company_name', 'series'],
+        )
+
+    def write_rows(self, csv_file, rows, stock_ids, batch_size):
+        # Upsert the rows of one file; returns the row count and the newest date per stock.
+        written = 0
+        missing = set()
+        last_dates = {}
+        for batch in batched(rows, batch_size):
+            prices = []
+            for ticker, date, values in batch:
+                stock_id = stock_ids.get(ticker)
+                if stock_id is None:
+                    missing.add(ticker)
+                    continue
+                prices.append(StockPrice(stock_id=stock_id, date=date, **dict(zip(PRICE_FIELDS, values))))
+                if date > last_dates.get(stock_id, date.min):
+                    last_dates[stock_id] = date
+            StockPrice.objects.bulk_create(
+                prices,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=['stock', 'date'],
+                update_fields=list(PRICE_FIELDS),
+            )
+            written += len(prices)
+        for ticker in sorted(missing):
+            self.stdout.write(self.style.WARNING(f"Unknown ticker {ticker} in file {csv_file}; rows skipped."))
+        return written, last_dates
@@ -0,0 +1,46 @@
+# Generated by Django 5.2 on 2026-10-18 18:52
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def backfill_last_imported_date(apps, schema_editor):
+    Stock = apps.get_model("stocks", "Stock")
+    for stock in Stock.objects.annotate(last_date=Max("prices__date")):
+        if stock.last_date is not None:
+            stock.last_imported_date = stock.last_date
+            stock.save(update_fields=["last_imported_date"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("stocks", "0002_remove_watchlist_description_remove_watchlist_name"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportedFile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("file_name", models.CharField(max_length=255, unique=True)),
+                ("size", models.BigIntegerField()),
+                ("mtime", models.FloatField()),
+                ("sha256", models.CharField(max_length=64)),
+                ("imported_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="stock",
+            name="last_imported_date",
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_last_imported_date, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,109 @@
+# Generated by Django 5.2 on 2026-10-18 18:56
+
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Snapshot field -> days before the latest trading date, as in stocks.snapshots.
+PERIODS = (("week_ago", 7), ("month_ago", 30), ("year_ago", 365))
+
+
+def build_snapshots(apps, schema_editor):
+    # Snapshots of the existing prices, built like stocks.snapshots.rebuild_snapshots()
+    # does: the latest price and the most recent one on or before each period's day.
+    Stock = apps.get_model("stocks", "Stock")
+    StockPrice = apps.get_model("stocks", "StockPrice")
+    StockSnapshot = apps.get_model("stocks", "StockSnapshot")
+    history = defaultdict(lambda: ([], []))
+    prices = StockPrice.objects.order_by("stock_id", "date").values_list("stock_id", "date", "id")
+    for stock_id, date, price_id in prices.iterator(chunk_size=10000):
+        dates, ids = history[stock_id]
+        dates.append(date)
+        ids.append(price_id)
+
+    snapshots = []
+    for stock_id in Stock.objects.values_list("id", flat=True):
+        snapshot = StockSnapshot(stock_id=stock_id)
+        dates, ids = history.get(stock_id, ([], []))
+        if dates:
+            snapshot.latest_id = ids[-1]
+            for field, days in PERIODS:
+                index = bisect_right(dates, dates[-1] - timedelta(days=days))
+                setattr(snapshot, f"{field}_id", ids[index - 1] if index else None)
+        snapshots.append(snapshot)
+    StockSnapshot.objects.bulk_create(snapshots, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("stocks", "0003_importedfile_stock_last_imported_date"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "latest",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="stocks.stockprice",
+                    ),
+                ),
+                (
+                    "month_ago",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="stocks.stockprice",
+                    ),
+                ),
+                (
+                    "stock",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="snapshot",
+                        to="stocks.stock",
+                    ),
+                ),
+                (
+                    "week_ago",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="stocks.stockprice",
+                    ),
+                ),
+                (
+                    "year_ago",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="stocks.stockprice",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(build_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-18 19:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("stocks", "0004_stocksnapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockRiskMetrics",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("window", models.CharField(max_length=8)),
+                ("as_of", models.DateField(blank=True, null=True)),
+                ("observations", models.PositiveIntegerField(default=0)),
+                ("volatility", models.FloatField(blank=True, null=True)),
+                ("sharpe_ratio", models.FloatField(blank=True, null=True)),
+                ("max_drawdown", models.FloatField(blank=True, null=True)),
+                ("risk_score", models.FloatField(blank=True, null=True)),
+                (
+                    "stock",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="risk_metrics",
+                        to="stocks.stock",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("stock", "window")},
+            },
+        ),
+    ]
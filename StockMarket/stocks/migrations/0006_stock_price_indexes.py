@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-18 19:09
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("stocks", "0005_stockriskmetrics"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="stock",
+            index=models.Index(
+                fields=["industry", "ticker"], name="stock_industry_ticker_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stock",
+            index=models.Index(
+                django.db.models.functions.text.Upper("company_name"),
+                name="stock_company_upper_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stockprice",
+            index=models.Index(
+                fields=["stock", "date", "close_price"],
+                name="price_stock_date_close_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stockprice",
+            index=models.Index(fields=["-date", "stock"], name="price_date_stock_idx"),
+        ),
+    ]
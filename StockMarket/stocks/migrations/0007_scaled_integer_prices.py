@@ -0,0 +1,117 @@
+# Generated by Django 5.2 on 2026-10-18 19:15
+
+from decimal import Decimal
+
+import stocks.fields
+from django.db import migrations
+from django.db.models import BigIntegerField, F
+from django.db.models.functions import Cast, Round
+
+PRICE_FIELDS = [
+    "prev_close_price",
+    "open_price",
+    "high_price",
+    "last_price",
+    "low_price",
+    "close_price",
+    "VWAP",
+]
+DECIMAL_PLACES = 4
+SCALE = 10**DECIMAL_PLACES
+
+
+def scale_prices(apps, schema_editor):
+    # Still decimal columns here: store round(price * 10^4), which the integer
+    # columns below then take over exactly.
+    StockPrice = apps.get_model("stocks", "StockPrice")
+    StockPrice.objects.update(
+        **{field: Round(F(field) * SCALE) for field in PRICE_FIELDS}
+    )
+
+
+def unscale_prices(apps, schema_editor):
+    # Decimal columns again, still holding the scaled integers. Rescaled in Python
+    # rather than SQL, where division truncates (SQLite integers) or rounds (floats):
+    # the integers are read as such and shifted back as exact Decimals.
+    StockPrice = apps.get_model("stocks", "StockPrice")
+    connection = schema_editor.connection
+    fields = [StockPrice._meta.get_field(name) for name in PRICE_FIELDS]
+    rows = StockPrice.objects.using(connection.alias).values_list(
+        "id", *(Cast(field.name, BigIntegerField()) for field in fields)
+    )
+    params = [
+        [
+            field.get_db_prep_save(
+                None if value is None else Decimal(value).scaleb(-DECIMAL_PLACES),
+                connection,
+            )
+            for field, value in zip(fields, row[1:])
+        ]
+        + [row[0]]
+        for row in rows.iterator(chunk_size=10000)
+    ]
+    assignments = ", ".join(f"{schema_editor.quote_name(field.column)} = %s" for field in fields)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {schema_editor.quote_name(StockPrice._meta.db_table)} SET {assignments} WHERE id = %s",
+            params,
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("stocks", "0006_stock_price_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(scale_prices, unscale_prices),
+        migrations.AlterField(
+            model_name="stockprice",
+            name="VWAP",
+            field=stocks.fields.ScaledDecimalField(
+                blank=True, decimal_places=4, max_digits=15, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="stockprice",
+            name="close_price",
+            field=stocks.fields.ScaledDecimalField(
+                blank=True, decimal_places=4, max_digits=15, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="stockprice",
+            name="high_price",
+            field=stocks.fields.ScaledDecimalField(
+                blank=True, decimal_places=4, max_digits=15, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="stockprice",
+            name="last_price",
+            field=stocks.fields.ScaledDecimalField(
+                blank=True, decimal_places=4, max_digits=15, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="stockprice",
+            name="low_price",
+            field=stocks.fields.ScaledDecimalField(
+                blank=True, decimal_places=4, max_digits=15, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="stockprice",
+            name="open_price",
+            field=stocks.fields.ScaledDecimalField(
+                blank=True, decimal_places=4, max_digits=15, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="stockprice",
+            name="prev_close_price",
+            field=stocks.fields.ScaledDecimalField(
+                blank=True, decimal_places=4, max_digits=15, null=True
+            ),
+        ),
+    ]
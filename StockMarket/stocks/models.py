@@ -1,5 +1,7 @@
 from django.db import models
+from django.db.models.functions import Upper
 from django.contrib.auth.models import User
+from stocks.fields import ScaledDecimalField
 
 class Stock(models.Model):
 
@@ -7,6 +9,16 @@ class Stock(models.Model):
     company_name = models.CharField(max_length=100)
     series = models.CharField(max_length=10)
     industry = models.CharField(max_length=100, blank=True, null=True)
+    # Most recent price date written by import_all_csv (incremental high-water mark).
+    last_imported_date = models.DateField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # ?industry= filters, listed in ticker (cursor) order.
+            models.Index(fields=['industry', 'ticker'], name='stock_industry_ticker_idx'),
+            # Case-insensitive company name prefix search (see stocks.search).
+            models.Index(Upper('company_name'), name='stock_company_upper_idx'),
+        ]
 
     def __str__(self):
         return self.ticker
@@ -14,22 +26,72 @@ class Stock(models.Model):
 class StockPrice(models.Model):
     stock = models.ForeignKey(Stock, related_name='prices', on_delete=models.CASCADE)
     date = models.DateField()
-    prev_close_price = models.DecimalField(max_digits=15, decimal_places=4, blank=True, null=True)
-    open_price = models.DecimalField(max_digits=15, decimal_places=4, blank=True, null=True)
-    high_price = models.DecimalField(max_digits=15, decimal_places=4, blank=True, null=True)
-    last_price = models.DecimalField(max_digits=15, decimal_places=4, blank=True, null=True)
-    low_price = models.DecimalField(max_digits=15, decimal_places=4, blank=True, null=True)
-    close_price = models.DecimalField(max_digits=15, decimal_places=4, blank=True, null=True)
-    VWAP = models.DecimalField(max_digits=15, decimal_places=4, blank=True, null=True)  
+    # Prices are Decimals stored as scaled integers (see stocks.fields.ScaledDecimalField).
+    # This storage is mandatory, not a setting: migration 0007 converts the columns and
+    # raw SQL on them must divide by the field's scale. Holdings stay DecimalField.
+    prev_close_price = ScaledDecimalField(max_digits=15, decimal_places=4, blank=True, null=True)
+    open_price = ScaledDecimalField(max_digits=15, decimal_places=4, blank=True, null=True)
+    high_price = ScaledDecimalField(max_digits=15, decimal_places=4, blank=True, null=True)
+    last_price = ScaledDecimalField(max_digits=15, decimal_places=4, blank=True, null=True)
+    low_price = ScaledDecimalField(max_digits=15, decimal_places=4, blank=True, null=True)
+    close_price = ScaledDecimalField(max_digits=15, decimal_places=4, blank=True, null=True)
+    VWAP = ScaledDecimalField(max_digits=15, decimal_places=4, blank=True, null=True)  
     volume = models.BigIntegerField(blank=True, null=True)
 
     class Meta:
         unique_together = ('stock', 'date')  # Ensures one record per day for each stock
         ordering = ['-date']
+        indexes = [
+            # Covers "latest N closes" and "close at or before a date" per stock, and
+            # close-price matrix loads, without touching the table rows.
+            models.Index(fields=['stock', 'date', 'close_price'], name='price_stock_date_close_idx'),
+            # Date windows across all stocks, newest first (price list cursor order).
+            models.Index(fields=['-date', 'stock'], name='price_date_stock_idx'),
+        ]
 
     def __str__(self):
         return f"{self.stock.ticker} on {self.date}"
 
+class StockSnapshot(models.Model):
+    # Denormalized latest and period-ago prices per stock, rebuilt by import_all_csv.
+    stock = models.OneToOneField(Stock, related_name='snapshot', on_delete=models.CASCADE)
+    latest = models.ForeignKey(StockPrice, related_name='+', blank=True, null=True, on_delete=models.SET_NULL)
+    week_ago = models.ForeignKey(StockPrice, related_name='+', blank=True, null=True, on_delete=models.SET_NULL)
+    month_ago = models.ForeignKey(StockPrice, related_name='+', blank=True, null=True, on_delete=models.SET_NULL)
+    year_ago = models.ForeignKey(StockPrice, related_name='+', blank=True, null=True, on_delete=models.SET_NULL)
+
+    def __str__(self):
+        return f"Snapshot of {self.stock.ticker}"
+
+class StockRiskMetrics(models.Model):
+    # Risk metrics of a stock over a trailing window of daily returns (see
+    # stocks.risk.WINDOWS), rebuilt by import_all_csv. NULL when there is too little history.
+    stock = models.ForeignKey(Stock, related_name='risk_metrics', on_delete=models.CASCADE)
+    window = models.CharField(max_length=8)
+    as_of = models.DateField(blank=True, null=True)
+    observations = models.PositiveIntegerField(default=0)
+    volatility = models.FloatField(blank=True, null=True)
+    sharpe_ratio = models.FloatField(blank=True, null=True)
+    max_drawdown = models.FloatField(blank=True, null=True)
+    risk_score = models.FloatField(blank=True, null=True)
+
+    class Meta:
+        unique_together = ('stock', 'window')
+
+    def __str__(self):
+        return f"{self.window} risk of {self.stock.ticker}"
+
+class ImportedFile(models.Model):
+    # Fingerprint of a dataset CSV file as of its last import, used to skip unchanged files.
+    file_name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField()
+    mtime = models.FloatField()
+    sha256 = models.CharField(max_length=64)
+    imported_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.file_name
+
 class Portfolio(models.Model):
     # 1 Portfolio belongs to 1 User
     # 1 User can have multiple Portfolios
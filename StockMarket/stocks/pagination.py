@@ -0,0 +1,26 @@
+from rest_framework.pagination import CursorPagination
+
+
+# Cursor pagination for the stock list. Plain listings stay unpaginated unless the
+# client asks for ?page_size=, so existing clients keep receiving a bare list;
+# listings with nested prices are always paginated.
+class StockCursorPagination(CursorPagination):
+    ordering = 'ticker'
+    page_size = None
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    with_prices_page_size = 20
+
+    def get_page_size(self, request):
+        page_size = super().get_page_size(request)
+        if page_size is None and request.query_params.get('with_prices') == 'true':
+            return self.with_prices_page_size
+        return page_size
+
+
+# Cursor pagination for raw price rows, newest first.
+class StockPriceCursorPagination(CursorPagination):
+    ordering = ('-date', 'stock_id')
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
@@ -0,0 +1,35 @@
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from stocks.models import StockPrice
+
+
+class LatestPriceResolver:
+    """
+    Memoizes the latest StockPrice of each stock for the lifetime of one
+    serializer tree. prime() loads any number of stocks with one window query.
+    """
+
+    def __init__(self):
+        self._latest = {}
+
+    def prime(self, stock_ids):
+        missing = set(stock_ids) - self._latest.keys()
+        if not missing:
+            return
+        ranked = StockPrice.objects.filter(stock_id__in=missing).annotate(
+            rank=Window(RowNumber(), partition_by=F('stock_id'), order_by=F('date').desc())
+        ).filter(rank=1)
+        found = {price.stock_id: price for price in ranked}
+        for stock_id in missing:
+            self._latest[stock_id] = found.get(stock_id)
+
+    def latest(self, stock_id):
+        if stock_id not in self._latest:
+            self.prime([stock_id])
+        return self._latest[stock_id]
+
+
+def price_resolver(serializer):
+    # Nested serializers share the root serializer's context, so one resolver
+    # serves the whole response.
+    return serializer.context.setdefault('price_resolver', LatestPriceResolver())
@@ -0,0 +1,59 @@
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+# Helpers for parsing list-endpoint query parameters.
+
+
+def parse_fields(value, nested=None):
+    """
+    Parse a ?fields= projection such as "ticker,prices.date,prices.close_price".
+
+    Returns {None: top-level names, <prefix>: nested names}; a key is only
+    present when fields were requested for it. `nested` lists the allowed
+    dotted prefixes.
+    """
+    projection = {}
+    if not value:
+        return projection
+    for name in value.split(','):
+        name = name.strip()
+        if not name:
+            continue
+        prefix, _, field = name.rpartition('.')
+        if prefix and prefix not in (nested or ()):
+            raise ValidationError({'fields': f"Unknown field prefix '{prefix}'."})
+        projection.setdefault(prefix or None, set()).add(field)
+    if None in projection:
+        # Asking for "prices.date" implies the "prices" field itself.
+        projection[None].update(prefix for prefix in projection if prefix)
+    return projection
+
+
+def model_fields(model, names):
+    # The concrete model fields among the requested names, for QuerySet.only().
+    return [field.name for field in model._meta.concrete_fields if field.name in names]
+
+
+def parse_date_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: 'Expected a date in YYYY-MM-DD format.'})
+    return parsed
+
+
+def date_window(request):
+    # The ?from= / ?to= bounds (inclusive) as filter() keyword arguments.
+    bounds = {}
+    start = parse_date_param(request, 'from')
+    end = parse_date_param(request, 'to')
+    if start:
+        bounds['date__gte'] = start
+    if end:
+        bounds['date__lte'] = end
+    return bounds
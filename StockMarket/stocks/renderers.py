@@ -0,0 +1,41 @@
+import json
+import struct
+import numpy as np
+from rest_framework.renderers import BaseRenderer
+
+
+class OHLCVBinaryRenderer(BaseRenderer):
+    """
+    Packs an OHLCV series (see stocks.timeseries.load_ohlcv) into a compact
+    little-endian buffer, selected with ?format=bin or Accept: application/octet-stream.
+
+    Layout, every section 8-byte aligned so it can be viewed directly as a
+    typed array (e.g. Float64Array / BigInt64Array in the browser):
+
+        16-byte header: b'OHLC', uint32 version (1), uint32 row count n, uint32 reserved
+        int64[n]   dates as days since 1970-01-01
+        float64[n] open, high, low, close (NaN when missing)
+        int64[n]   volume (-1 when missing)
+
+    Error responses (plain dicts) are rendered as JSON.
+    """
+    media_type = 'application/octet-stream'
+    format = 'bin'
+    charset = None
+    render_style = 'binary'
+    version = 1
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if 'dates' not in data:
+            return json.dumps(data).encode('utf-8')
+        count = len(data['dates'])
+        parts = [
+            struct.pack('<4sIII', b'OHLC', self.version, count, 0),
+            data['dates'].astype('datetime64[D]').astype('<i8').tobytes(),
+        ]
+        for name in ('open', 'high', 'low', 'close'):
+            parts.append(np.asarray(data[name], dtype='<f8').tobytes())
+        parts.append(np.asarray(data['volume'], dtype='<i8').tobytes())
+        return b''.join(parts)
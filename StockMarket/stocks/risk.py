@@ -0,0 +1,155 @@
+import warnings
+import numpy as np
+from django.db import transaction
+from stocks.models import Stock, StockPrice, StockRiskMetrics
+from stocks.timeseries import daily_returns, load_close_matrix, last_valid_dates
+
+# Vectorized risk metrics for many tickers at once. Definitions follow
+# frontend/risk.py (quantstats): annualized volatility, Sharpe ratio with a 1%
+# annual risk-free rate, maximum drawdown and the 0.5/0.3/0.2 weighted score.
+
+TRADING_DAYS = 252
+RISK_FREE_RATE = 0.01
+RISK_WEIGHTS = {
+    'volatility': 0.5,
+    'sharpe_ratio': 0.3,
+    'max_drawdown': 0.2,
+}
+METRICS = tuple(RISK_WEIGHTS)
+RESULT_FIELDS = METRICS + ('risk_score',)
+
+# Lookback windows stored in StockRiskMetrics: label -> trailing daily returns
+# per ticker (None for the full history).
+WINDOWS = (
+    ('3m', 63),
+    ('6m', 126),
+    ('1y', 252),
+    ('all', None),
+)
+
+
+def volatility(returns):
+    return np.nanstd(returns, axis=0, ddof=1) * np.sqrt(TRADING_DAYS)
+
+
+def sharpe_ratio(returns, rf=RISK_FREE_RATE):
+    # The annual risk-free rate is de-annualized per period before it is subtracted.
+    excess = returns - (np.power(1 + rf, 1 / TRADING_DAYS) - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.nanmean(excess, axis=0) / np.nanstd(excess, axis=0, ddof=1)
+    return ratio * np.sqrt(TRADING_DAYS)
+
+
+def max_drawdown(returns):
+    # Compounded wealth from each column's first return onwards (missing returns
+    # count as flat); the running peak starts at that first value, not at 1.
+    present = ~np.isnan(returns)
+    wealth = np.cumprod(1 + np.where(present, returns, 0), axis=0)
+    wealth = np.where(np.cumsum(present, axis=0) > 0, wealth, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdown = wealth / np.fmax.accumulate(wealth, axis=0) - 1
+    drawdown = np.where(np.isnan(returns), np.nan, drawdown)
+    # fmin skips NaN; the NaN initial value also covers an empty matrix.
+    return np.fmin.reduce(drawdown, axis=0, initial=np.nan)
+
+
+def risk_score(metrics):
+    return sum(metrics[name] * weight for name, weight in RISK_WEIGHTS.items())
+
+
+def compute_risk(returns):
+    """
+    Compute every metric for a (dates x tickers) matrix of daily returns.
+    Returns a dict of metric name -> array with one value per ticker (NaN
+    where a ticker has fewer than two returns).
+    """
+    observations = np.count_nonzero(~np.isnan(returns), axis=0)
+    enough = observations >= 2
+    metrics = {}
+    with warnings.catch_warnings():
+        # All-NaN columns are expected for tickers without enough history.
+        warnings.simplefilter('ignore', RuntimeWarning)
+        metrics['volatility'] = volatility(returns)
+        metrics['sharpe_ratio'] = sharpe_ratio(returns)
+        metrics['max_drawdown'] = max_drawdown(returns)
+    for name in METRICS:
+        metrics[name] = np.where(enough, metrics[name], np.nan)
+    metrics['risk_score'] = risk_score(metrics)
+    metrics['observations'] = observations
+    return metrics
+
+
+def trailing(returns, count):
+    # Keep only each column's last `count` non-NaN returns.
+    if count is None:
+        return returns
+    present = ~np.isnan(returns)
+    from_end = np.cumsum(present[::-1], axis=0)[::-1]
+    return np.where(present & (from_end <= count), returns, np.nan)
+
+
+def metric_values(metrics, column):
+    # One ticker's metrics as plain Python values, None where undefined.
+    values = {}
+    for name in RESULT_FIELDS:
+        value = float(metrics[name][column])
+        values[name] = None if np.isnan(value) else value
+    values['observations'] = int(metrics['observations'][column])
+    return values
+
+
+def risk_table(prices):
+    """
+    Risk metrics for every ticker in a StockPrice queryset, loaded with one
+    query. Returns one dict per ticker, sorted by ticker; metrics that cannot
+    be computed are None.
+    """
+    dates, tickers, closes = load_close_matrix(prices)
+    if len(dates) < 2:
+        return [dict({'ticker': ticker, 'observations': 0}, **dict.fromkeys(RESULT_FIELDS)) for ticker in tickers]
+    metrics = compute_risk(daily_returns(closes))
+    return [dict({'ticker': ticker}, **metric_values(metrics, column)) for column, ticker in enumerate(tickers)]
+
+
+def rebuild_risk_metrics(stock_ids=None):
+    """
+    Recompute StockRiskMetrics for the given stock ids (all stocks by default)
+    over every window in WINDOWS, from one load of their close prices.
+    Returns the number of stocks written.
+    """
+    stocks = Stock.objects.all()
+    prices = StockPrice.objects.all()
+    if stock_ids is not None:
+        stocks = stocks.filter(id__in=stock_ids)
+        prices = prices.filter(stock_id__in=stock_ids)
+
+    dates, ids, closes = load_close_matrix(prices, key='stock_id')
+    columns = {stock_id: column for column, stock_id in enumerate(ids)}
+    if len(dates) >= 2:
+        returns = daily_returns(closes)
+        by_window = {label: compute_risk(trailing(returns, count)) for label, count in WINDOWS}
+        as_of = last_valid_dates(dates, closes).tolist()
+    else:
+        by_window, as_of = {}, [None] * len(ids)
+
+    rows = []
+    stock_ids = list(stocks.values_list('id', flat=True))
+    for stock_id in stock_ids:
+        column = columns.get(stock_id)
+        for label, _ in WINDOWS:
+            row = StockRiskMetrics(stock_id=stock_id, window=label)
+            if column is not None:
+                row.as_of = as_of[column]
+                if label in by_window:
+                    for name, value in metric_values(by_window[label], column).items():
+                        setattr(row, name, value)
+            rows.append(row)
+
+    with transaction.atomic():
+        StockRiskMetrics.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['stock', 'window'],
+            update_fields=['as_of', 'observations', *RESULT_FIELDS],
+        )
+    return len(stock_ids)
@@ -0,0 +1,300 @@
+import ast
+import operator
+import threading
+from functools import reduce
+import numpy as np
+from stocks.cache import data_generation
+from stocks.models import Stock, StockPrice, StockRiskMetrics
+from stocks.risk import RESULT_FIELDS
+from stocks.timeseries import DATE_TEXT, fetch_columns, to_date_array, to_field_array, to_float_array
+
+# Cross-sectional stock screener. Every stock's derived fields are computed once
+# per market data generation into NumPy columns (the "universe"); a screen then
+# evaluates its filter and sort expressions on whole columns at once.
+
+TEXT_FIELDS = ('ticker', 'company_name', 'industry')
+
+# Trailing trading-day windows for average volumes and volume ratios.
+VOLUME_WINDOWS = (20, 50)
+YEAR = np.timedelta64(365, 'D')
+
+# Risk metrics come from this StockRiskMetrics window.
+RISK_WINDOW = '1y'
+
+NUMBER_FIELDS = (
+    'close', 'volume',
+    'return_1w', 'return_1m', 'return_1y',
+    *(f'avg_volume_{days}' for days in VOLUME_WINDOWS),
+    *(f'volume_ratio_{days}' for days in VOLUME_WINDOWS),
+    'high_52w', 'low_52w', 'from_high_52w', 'from_low_52w',
+    *RESULT_FIELDS,
+)
+FIELDS = TEXT_FIELDS + NUMBER_FIELDS
+
+COMPARISONS = {
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+}
+ARITHMETIC = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+FUNCTIONS = {
+    'abs': np.abs,
+}
+
+
+def kind(value):
+    # 'b' (condition), 'f' (number) or 'U' (text), for operand checks.
+    value_kind = np.asarray(value).dtype.kind
+    return 'f' if value_kind in 'iuf' else value_kind
+
+
+class Expression:
+    """
+    A screener expression such as
+
+        return_1m > 0.05 and volume_ratio_20 > 1 and industry in ('IT', 'BANK')
+
+    It is parsed with Python's grammar (ast) and evaluated by walking a small
+    whitelist of node types over the universe columns, so nothing is ever
+    executed. Supported: field names, number and string literals, + - * /,
+    comparisons (chained too), in / not in a literal list, and / or / not,
+    and abs(). A comparison with a missing value (NaN) is false.
+    """
+    max_length = 500
+
+    def __init__(self, text):
+        self.text = text.strip()
+        if len(self.text) > self.max_length:
+            raise ValueError(f'Expressions are limited to {self.max_length} characters.')
+        try:
+            self.tree = ast.parse(self.text, mode='eval').body
+        except (SyntaxError, RecursionError):
+            raise ValueError(f"Invalid expression '{self.text}'.")
+
+    def evaluate(self, columns):
+        with np.errstate(all='ignore'):
+            return self.visit(self.tree, columns)
+
+    def visit(self, node, columns):
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str)):
+            return node.value
+        if isinstance(node, ast.Name):
+            if node.id not in columns:
+                raise ValueError(f"Unknown field '{node.id}'. Fields: {', '.join(FIELDS)}.")
+            return columns[node.id]
+        if isinstance(node, ast.BoolOp):
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            return reduce(combine, [self.operand(value, columns, 'b') for value in node.values])
+        if isinstance(node, ast.UnaryOp):
+            if isinstance(node.op, ast.Not):
+                return np.logical_not(self.operand(node.operand, columns, 'b'))
+            if isinstance(node.op, ast.USub):
+                return -self.operand(node.operand, columns, 'f')
+            if isinstance(node.op, ast.UAdd):
+                return self.operand(node.operand, columns, 'f')
+        if isinstance(node, ast.BinOp) and type(node.op) in ARITHMETIC:
+            left = self.operand(node.left, columns, 'f')
+            return ARITHMETIC[type(node.op)](left, self.operand(node.right, columns, 'f'))
+        if isinstance(node, ast.Compare):
+            return self.compare(node, columns)
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS
+                and len(node.args) == 1 and not node.keywords):
+            return FUNCTIONS[node.func.id](self.operand(node.args[0], columns, 'f'))
+        raise ValueError(f"Unsupported expression '{ast.unparse(node)}'.")
+
+    def operand(self, node, columns, expected):
+        value = self.visit(node, columns)
+        if kind(value) != expected:
+            wanted = {'b': 'a condition', 'f': 'a number', 'U': 'text'}[expected]
+            raise ValueError(f"'{ast.unparse(node)}' is not {wanted}.")
+        return value
+
+    def compare(self, node, columns):
+        result = True
+        left = self.visit(node.left, columns)
+        for op, right_node in zip(node.ops, node.comparators):
+            if isinstance(op, (ast.In, ast.NotIn)):
+                if not isinstance(right_node, (ast.Tuple, ast.List, ast.Set)):
+                    raise ValueError(f"'{ast.unparse(right_node)}' must be a list of values.")
+                right = [self.visit(element, columns) for element in right_node.elts]
+                if any(isinstance(value, np.ndarray) for value in right):
+                    raise ValueError(f"'{ast.unparse(right_node)}' must be a list of values.")
+                if any(kind(value) != kind(left) for value in right):
+                    raise ValueError(f"Cannot compare '{ast.unparse(node.left)}' with '{ast.unparse(right_node)}'.")
+                outcome = np.isin(left, right, invert=isinstance(op, ast.NotIn))
+            else:
+                right = self.visit(right_node, columns)
+                if kind(left) != kind(right) or kind(left) == 'b':
+                    raise ValueError(f"Cannot compare '{ast.unparse(node.left)}' with '{ast.unparse(right_node)}'.")
+                outcome = COMPARISONS[type(op)](left, right)
+            result = np.logical_and(result, outcome)
+            left = right
+        return result
+
+
+def sort_keys(terms, columns):
+    """
+    np.lexsort keys for a comma-separated list of sort expressions, each
+    descending when prefixed with '-'. Missing values sort last either way.
+    """
+    keys = []
+    for term in reversed([term.strip() for term in terms.split(',') if term.strip()]):
+        descending = term.startswith('-')
+        values = Expression(term[1:] if descending else term).evaluate(columns)
+        if kind(values) == 'U':
+            values, missing = np.unique(values, return_inverse=True)[1], values == ''
+        elif kind(values) == 'f':
+            values = np.asarray(values, dtype=np.float64)
+            missing = np.isnan(values)
+        else:
+            raise ValueError(f"Cannot sort by '{term}'.")
+        keys += [-values if descending else values, missing]
+    return keys
+
+
+class ScreenerUniverse:
+    """
+    Derived fields of every stock, one NumPy column per field in ticker order.
+
+    Returns are the latest close against the week, month and year-ago closes
+    of the stock snapshot. Volume averages are over the last N trading days
+    (NaN with fewer days), 52-week high and low over the year to the stock's
+    latest date, and risk metrics are those of the RISK_WINDOW lookback.
+    """
+
+    def __init__(self):
+        stocks = list(Stock.objects.order_by('ticker').values_list(
+            'id', *TEXT_FIELDS, 'snapshot__latest__date', 'snapshot__latest__close_price',
+            'snapshot__latest__volume', 'snapshot__week_ago__close_price',
+            'snapshot__month_ago__close_price', 'snapshot__year_ago__close_price',
+        ))
+        ids, tickers, names, industries, dates, close, volume, week, month, year = list(zip(*stocks)) or [()] * 10
+        self.size = len(stocks)
+        self.ids = np.array(ids, dtype=np.int64)
+        self.dates = np.array(dates, dtype='datetime64[D]')
+        known = self.dates[~np.isnat(self.dates)]
+        self.as_of = str(known.max()) if len(known) else None
+        columns = {
+            'ticker': np.array(tickers, dtype=str),
+            'company_name': np.array(names, dtype=str),
+            'industry': np.array([industry or '' for industry in industries], dtype=str),
+            'close': to_float_array(close),
+            'volume': to_float_array(volume),
+        }
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for name, past in (('return_1w', week), ('return_1m', month), ('return_1y', year)):
+                columns[name] = columns['close'] / to_float_array(past) - 1
+            columns.update(self.history_columns(columns['close'], columns['volume']))
+        columns.update(self.risk_columns())
+        self.columns = columns
+
+    def positions(self, stock_ids):
+        # Row of each stock id in the universe.
+        order = np.argsort(self.ids)
+        return order[np.searchsorted(self.ids, stock_ids, sorter=order)]
+
+    def history_columns(self, close, volume):
+        columns = {}
+        known = self.dates[~np.isnat(self.dates)]
+        # One query for the year before the earliest snapshot date; rows are then cut per stock.
+        prices = StockPrice.objects.filter(date__gt=(known.min() - YEAR).item()) if len(known) else StockPrice.objects.none()
+        stock_ids, dates, highs, lows, volumes = fetch_columns(
+            prices.order_by('stock_id', 'date'), ['stock_id', DATE_TEXT, 'high_price', 'low_price', 'volume'],
+        )
+        stock_ids = np.array(stock_ids, dtype=np.int64)
+        rows = self.positions(stock_ids)
+        # Only each stock's own last year, up to its snapshot date.
+        dates = to_date_array(dates)
+        latest = self.dates[rows]
+        keep = (dates > latest - YEAR) & (dates <= latest)
+        stock_ids, rows = stock_ids[keep], rows[keep]
+
+        high = np.full(self.size, np.nan)
+        low = np.full(self.size, np.nan)
+        np.fmax.at(high, rows, to_field_array(StockPrice, 'high_price', highs)[keep])
+        np.fmin.at(low, rows, to_field_array(StockPrice, 'low_price', lows)[keep])
+        columns['high_52w'] = high
+        columns['low_52w'] = low
+        columns['from_high_52w'] = close / high - 1
+        columns['from_low_52w'] = close / low - 1
+
+        # Rows are grouped by stock, oldest first: count positions back from each group's end.
+        volumes = to_float_array(volumes)[keep]
+        starts = np.flatnonzero(np.diff(stock_ids, prepend=-1))
+        ends = np.append(starts[1:], len(stock_ids))
+        from_end = np.repeat(ends, ends - starts) - np.arange(len(stock_ids))
+        days = np.bincount(rows, minlength=self.size)
+        for window in VOLUME_WINDOWS:
+            recent = (from_end <= window) & ~np.isnan(volumes)
+            total = np.bincount(rows[recent], weights=volumes[recent], minlength=self.size)
+            count = np.bincount(rows[recent], minlength=self.size)
+            average = np.where(days >= window, total / count, np.nan)
+            columns[f'avg_volume_{window}'] = average
+            columns[f'volume_ratio_{window}'] = volume / average
+        return columns
+
+    def risk_columns(self):
+        columns = {name: np.full(self.size, np.nan) for name in RESULT_FIELDS}
+        metrics = list(StockRiskMetrics.objects.filter(window=RISK_WINDOW, stock_id__in=self.ids.tolist())
+                       .values_list('stock_id', *RESULT_FIELDS))
+        if metrics:
+            stock_ids, *values = zip(*metrics)
+            rows = self.positions(np.array(stock_ids, dtype=np.int64))
+            for name, column in zip(RESULT_FIELDS, values):
+                columns[name][rows] = to_float_array(column)
+        return columns
+
+    def screen(self, where=None, sort=None, limit=50):
+        """
+        Evaluate a filter expression and sort terms over the universe. Returns
+        the number of matching stocks and the first `limit` of them as dicts.
+        """
+        if where:
+            matched = Expression(where).evaluate(self.columns)
+            if kind(matched) != 'b':
+                raise ValueError(f"'{where}' is not a condition.")
+            selected = np.flatnonzero(np.broadcast_to(matched, (self.size,)))
+        else:
+            selected = np.arange(self.size)
+        if sort:
+            keys = [np.broadcast_to(key, (self.size,))[selected] for key in sort_keys(sort, self.columns)]
+            # lexsort is stable, so ties stay in ticker order.
+            selected = selected[np.lexsort(keys)]
+        return len(selected), [self.row(index) for index in selected[:limit]]
+
+    def row(self, index):
+        row = {'ticker': str(self.columns['ticker'][index])}
+        for name in TEXT_FIELDS[1:]:
+            row[name] = str(self.columns[name][index]) or None
+        date = self.dates[index]
+        row['date'] = None if np.isnat(date) else str(date)
+        for name in NUMBER_FIELDS:
+            value = float(self.columns[name][index])
+            row[name] = None if np.isnan(value) else value
+        return row
+
+
+_universe = {'generation': None, 'universe': None}
+_universe_lock = threading.Lock()
+
+
+def screener_universe():
+    """
+    The process-wide ScreenerUniverse, (re)built with three queries on first
+    use and whenever the market data generation changes (i.e. after an import).
+    """
+    generation = data_generation()
+    if _universe['generation'] != generation:
+        with _universe_lock:
+            if _universe['generation'] != generation:
+                _universe['universe'] = ScreenerUniverse()
+                _universe['generation'] = generation
+    return _universe['universe']
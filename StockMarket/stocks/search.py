@@ -0,0 +1,114 @@
+import threading
+from bisect import bisect_left
+from django.db.models import F, Q
+from django.db.models.functions import Upper
+from rest_framework import filters
+from stocks.cache import data_generation
+from stocks.models import Stock
+
+# Prefix search over stocks: PrefixSearchFilter in the database, TypeaheadIndex in memory.
+
+# Typeahead match ranks, best first.
+EXACT_TICKER, TICKER_PREFIX, NAME_PREFIX, WORD_PREFIX = range(4)
+
+
+def prefix_range(prefix):
+    # [low, high) bounds of the strings starting with `prefix`; a range comparison
+    # can use a B-tree index on any backend, unlike LIKE 'prefix%' on SQLite.
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+# Expressions ?search= compares with the upper-cased prefix: tickers are stored
+# upper-case (unique index), company names go through the UPPER(company_name) index.
+SEARCH_EXPRESSIONS = {
+    'ticker': F('ticker'),
+    'company_name': Upper('company_name'),
+}
+
+
+class PrefixSearchFilter(filters.SearchFilter):
+    """
+    ?search= as one case-insensitive prefix of the view's search_fields (any
+    of '^ticker' and '^company_name', see SEARCH_EXPRESSIONS), served by the
+    unique ticker index and the UPPER(company_name) index.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        fields = [field.lstrip('^') for field in self.get_search_fields(view, request) or ()]
+        return prefix_search(queryset, request.query_params.get(self.search_param, ''), fields)
+
+
+def prefix_search(queryset, term, fields=tuple(SEARCH_EXPRESSIONS)):
+    # Stocks with one of `fields` starting with `term` (any case); all of them when it is blank.
+    term = term.strip().upper()
+    if not term or not fields:
+        return queryset
+    low, high = prefix_range(term)
+    matches = Q()
+    for field in fields:
+        alias = f'search_{field}'
+        queryset = queryset.alias(**{alias: SEARCH_EXPRESSIONS[field]})
+        matches |= Q(**{f'{alias}__gte': low, f'{alias}__lt': high})
+    return queryset.filter(matches)
+
+
+class TypeaheadIndex:
+    """
+    In-memory prefix index over tickers and company names. Keys (the ticker,
+    the full company name and each later word of it, upper-cased) are kept in
+    one sorted list, so a lookup is two bisections plus a scan of the matches.
+    """
+
+    def __init__(self, stocks):
+        # stocks: (id, ticker, company name, last close) tuples.
+        self.entries = [
+            {'id': stock_id, 'ticker': ticker, 'name': name, 'last_close': None if last_close is None else float(last_close)}
+            for stock_id, ticker, name, last_close in stocks
+        ]
+        keys = []
+        for position, entry in enumerate(self.entries):
+            keys.append((entry['ticker'].upper(), TICKER_PREFIX, position))
+            name = (entry['name'] or '').upper()
+            keys.append((name, NAME_PREFIX, position))
+            for word in name.split()[1:]:
+                keys.append((word, WORD_PREFIX, position))
+        keys.sort()
+        self.keys = [key for key, _, _ in keys]
+        self.refs = [(rank, position) for _, rank, position in keys]
+
+    def search(self, query, limit=10):
+        query = query.strip().upper()
+        if not query:
+            return []
+        low, high = prefix_range(query)
+        best = {}
+        for index in range(bisect_left(self.keys, low), bisect_left(self.keys, high)):
+            rank, position = self.refs[index]
+            if rank == TICKER_PREFIX and self.keys[index] == query:
+                rank = EXACT_TICKER
+            if rank < best.get(position, len(self.refs)):
+                best[position] = rank
+        ranked = sorted(
+            best,
+            key=lambda position: (best[position], len(self.entries[position]['ticker']), self.entries[position]['ticker']),
+        )
+        return [self.entries[position] for position in ranked[:limit]]
+
+
+_typeahead = {'generation': None, 'index': None}
+_typeahead_lock = threading.Lock()
+
+
+def typeahead_index():
+    """
+    The process-wide TypeaheadIndex, (re)built with one query on first use and
+    whenever the market data generation changes (i.e. after an import).
+    """
+    generation = data_generation()
+    if _typeahead['generation'] != generation:
+        with _typeahead_lock:
+            if _typeahead['generation'] != generation:
+                stocks = Stock.objects.values_list('id', 'ticker', 'company_name', 'snapshot__latest__close_price')
+                _typeahead['index'] = TypeaheadIndex(stocks)
+                _typeahead['generation'] = generation
+    return _typeahead['index']
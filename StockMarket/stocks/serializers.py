@@ -1,70 +1,163 @@
 from rest_framework import serializers
-from stocks.models import Stock, StockPrice, Portfolio, Watchlist, PortfolioStock
+from django.db import models
+from django.db.models import prefetch_related_objects
+from stocks.models import Stock, StockPrice, StockRiskMetrics, Portfolio, Watchlist, PortfolioStock
+from stocks.snapshots import PERIODS, SNAPSHOT_RELATED, get_snapshot
+from stocks.prices import price_resolver
+from stocks.holdings import resolve_stocks
 import datetime
 from datetime import timedelta
 
-class StockPriceSerializer(serializers.ModelSerializer):
+PERIOD_DAYS = dict(PERIODS)
+
+
+def as_list(data):
+    # Same unwrapping ListSerializer.to_representation does for related managers.
+    return list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+
+
+# Keeps only the fields requested through context['fields'], a projection parsed
+# by stocks.query_params.parse_fields and keyed by the serializer's dotted path.
+# Names the serializer does not have are rejected with a 400 listing the allowed ones.
+class FieldProjectionMixin:
+    def get_fields(self):
+        fields = super().get_fields()
+        path = self.projection_path()
+        wanted = self.context.get('fields', {}).get(path)
+        if wanted:
+            unknown = wanted - set(fields)
+            if unknown:
+                prefix = f'{path}.' if path else ''
+                raise serializers.ValidationError({'fields': (
+                    f"Unknown field(s): {', '.join(prefix + name for name in sorted(unknown))}. "
+                    f"Allowed: {', '.join(prefix + name for name in fields)}."
+                )})
+            for name in set(fields) - wanted:
+                fields.pop(name)
+        return fields
+
+    def projection_path(self):
+        names = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                names.append(node.field_name)
+            node = node.parent
+        return '.'.join(reversed(names)) or None
+
+
+def check_projection(serializer, projection):
+    """
+    Validate a ?fields= projection against `serializer` and its nested
+    projected serializers up front, before any rows are loaded: an empty
+    result never resolves the fields FieldProjectionMixin checks.
+    """
+    paths = set()
+
+    def visit(serializer):
+        serializer = getattr(serializer, 'child', serializer)
+        paths.add(serializer.projection_path())
+        for field in serializer.fields.values():
+            if isinstance(getattr(field, 'child', field), FieldProjectionMixin):
+                visit(field)
+
+    visit(serializer)
+    unknown = set(projection) - paths
+    if unknown:
+        raise serializers.ValidationError({'fields': f"Unknown field prefix '{sorted(unknown)[0]}'."})
+
+
+class StockPriceSerializer(FieldProjectionMixin, serializers.ModelSerializer):
     class Meta:
         model = StockPrice
         fields = '__all__'
         read_only_fields = list(fields)  # OR just list all fields manually, safer!
 
-class StockSerializer(serializers.ModelSerializer):
+class StockSerializer(FieldProjectionMixin, serializers.ModelSerializer):
     prices = StockPriceSerializer(many=True, read_only=True)  # uses related_name='prices'
 
     class Meta:
         model = Stock
-        fields = '__all__'
+        fields = ('id', 'prices', 'ticker', 'company_name', 'series', 'industry')
+        read_only_fields = list(fields)
+
+class StockRiskMetricsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StockRiskMetrics
+        fields = ('as_of', 'observations', 'volatility', 'sharpe_ratio', 'max_drawdown', 'risk_score')
         read_only_fields = list(fields)
 
-class StockSerializerBasic(serializers.ModelSerializer):
+PRICE_FIELDS = {'latest_price', 'week_before_price', 'month_before_price', 'year_before_price'}
+
+
+# Loads every stock's snapshot (and, for stocks without one, its latest price)
+# and stored risk metrics in a constant number of queries before the stocks are serialized.
+class StockListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        stocks = as_list(data)
+        if 'risk' in self.child.fields:
+            prefetch_related_objects(stocks, 'risk_metrics')
+        if PRICE_FIELDS.intersection(self.child.fields):
+            prefetch_related_objects(stocks, *SNAPSHOT_RELATED)
+            price_resolver(self).prime(stock.id for stock in stocks if get_snapshot(stock) is None)
+        return super().to_representation(stocks)
+
+
+class StockSerializerBasic(FieldProjectionMixin, serializers.ModelSerializer):
     latest_price = serializers.SerializerMethodField()
     week_before_price = serializers.SerializerMethodField()
     month_before_price = serializers.SerializerMethodField()
     year_before_price = serializers.SerializerMethodField()
+    risk = serializers.SerializerMethodField()
 
     class Meta:
         model = Stock
         fields = ('id', 'ticker', 'company_name', 'series', 'industry', 
-                  'latest_price', 'week_before_price', 'month_before_price', 'year_before_price')
+                  'latest_price', 'week_before_price', 'month_before_price', 'year_before_price', 'risk')
+        list_serializer_class = StockListSerializer
 
-    def get_latest_price(self, obj):
-        latest = obj.prices.first()  # Assumes prices are ordered by '-date'
-        if latest:
-            return StockPriceSerializer(latest).data
+    def get_snapshot_price(self, obj, field, days=None):
+        # Prefer the precomputed snapshot (see stocks.snapshots); stocks that have
+        # not been snapshotted yet fall back to querying their prices.
+        snapshot = get_snapshot(obj)
+        if snapshot is not None:
+            price = getattr(snapshot, field)
+        else:
+            price = price_resolver(self).latest(obj.id)
+            if price and days is not None:
+                target_date = price.date - timedelta(days=days)
+                # Get the most recent price that is older than or equal to the target_date.
+                price = obj.prices.filter(date__lte=target_date).order_by("-date").first()
+        if price:
+            return StockPriceSerializer(price).data
         return None
+
+    def get_latest_price(self, obj):
+        return self.get_snapshot_price(obj, 'latest')
     
     def get_week_before_price(self, obj):
-        latest = obj.prices.first()
-        if not latest:
-            return None
-        target_date = latest.date - timedelta(days=7)
-        week_ago = obj.prices.filter(date__lte=target_date).order_by("-date").first()
-        if week_ago:
-            return StockPriceSerializer(week_ago).data
-        return None
+        return self.get_snapshot_price(obj, 'week_ago', PERIOD_DAYS['week_ago'])
 
     def get_month_before_price(self, obj):
-        latest = obj.prices.first()
-        if not latest:
-            return None
-        # Subtract 30 days from latest date
-        target_date = latest.date - timedelta(days=30)
-        # Get the most recent price that is older than or equal to the target_date.
-        month_ago = obj.prices.filter(date__lte=target_date).order_by("-date").first()
-        if month_ago:
-            return StockPriceSerializer(month_ago).data
-        return None
+        return self.get_snapshot_price(obj, 'month_ago', PERIOD_DAYS['month_ago'])
 
     def get_year_before_price(self, obj):
-        latest = obj.prices.first()
-        if not latest:
-            return None
-        target_date = latest.date - timedelta(days=365)
-        year_ago = obj.prices.filter(date__lte=target_date).order_by("-date").first()
-        if year_ago:
-            return StockPriceSerializer(year_ago).data
-        return None
+        return self.get_snapshot_price(obj, 'year_ago', PERIOD_DAYS['year_ago'])
+
+    def get_risk(self, obj):
+        # Stored risk metrics (see stocks.risk.WINDOWS), keyed by window.
+        return {
+            metrics.window: StockRiskMetricsSerializer(metrics).data
+            for metrics in obj.risk_metrics.all()
+        }
+
+
+# Primes the latest prices of all holdings with one query.
+class PortfolioStockListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        holdings = as_list(data)
+        price_resolver(self).prime(holding.stock_id for holding in holdings)
+        return super().to_representation(holdings)
 
 
 # Serializer for the through model PortfolioStock.
@@ -76,14 +169,25 @@ class PortfolioStockSerializer(serializers.ModelSerializer):
     class Meta:
         model = PortfolioStock
         fields = ['id', 'ticker', 'buy_price', 'shares', 'current_close']
+        list_serializer_class = PortfolioStockListSerializer
     
     def get_current_close(self, obj):
-        latest_price = obj.stock.prices.first()  # Assuming ordering by descending date
+        latest_price = price_resolver(self).latest(obj.stock_id)
         if latest_price and latest_price.close_price is not None:
             return latest_price.close_price
         return None
 
 
+# Primes the latest prices of the holdings of every listed portfolio at once.
+class PortfolioListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        portfolios = as_list(data)
+        price_resolver(self).prime(
+            holding.stock_id for portfolio in portfolios for holding in portfolio.portfoliostock_set.all()
+        )
+        return super().to_representation(portfolios)
+
+
 class PortfolioSerializer(serializers.ModelSerializer):
     # Use the through relation to receive nested stock entries.
     stocks = PortfolioStockSerializer(source='portfoliostock_set', many=True, required=False)
@@ -91,28 +195,50 @@ class PortfolioSerializer(serializers.ModelSerializer):
     class Meta:
         model = Portfolio
         fields = ['id', 'name', 'description', 'stocks']
+        list_serializer_class = PortfolioListSerializer
 
     def create(self, validated_data):
         stocks_data = validated_data.pop('portfoliostock_set', [])
         portfolio = Portfolio.objects.create(**validated_data)
-        for stock_data in stocks_data:
-            # Expect the input to have a structure: {"stock": {"ticker": "AXISBANK"}, "buy_price": 10, "shares": 1000}
-            ticker = stock_data.get('stock', {}).get('ticker')
-            buy_price = stock_data.get('buy_price')
-            shares = stock_data.get('shares')
-            try:
-                stock = Stock.objects.get(ticker=ticker)
-                PortfolioStock.objects.create(
+        # Expect the input to have a structure: {"stock": {"ticker": "AXISBANK"}, "buy_price": 10, "shares": 1000}
+        # All tickers resolve with one query; unknown tickers are skipped.
+        stocks = resolve_stocks([(None, stock_data.get('stock', {}).get('ticker')) for stock_data in stocks_data])
+        holdings = {}
+        for stock_data, stock in zip(stocks_data, stocks):
+            if stock is not None:
+                holdings[stock.id] = PortfolioStock(
                     portfolio=portfolio,
                     stock=stock,
-                    buy_price=buy_price,
-                    shares=shares
+                    buy_price=stock_data.get('buy_price'),
+                    shares=stock_data.get('shares')
                 )
-            except Stock.DoesNotExist:
-                # Optionally log or skip the stock if not found.
-                continue
+        PortfolioStock.objects.bulk_create(holdings.values())
         return portfolio
 
+
+# buy_price and shares of a single holding addressed by its stock.
+class HoldingValuesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PortfolioStock
+        fields = ['buy_price', 'shares']
+
+
+# One entry of a bulk holdings request: a stock by id or ticker, with either
+# buy_price and shares to set, or remove=true.
+class HoldingItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField(required=False)
+    ticker = serializers.CharField(required=False, max_length=10)
+    buy_price = serializers.DecimalField(max_digits=15, decimal_places=4, required=False)
+    shares = serializers.DecimalField(max_digits=15, decimal_places=4, required=False)
+    remove = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if 'id' not in data and not data.get('ticker'):
+            raise serializers.ValidationError('Either id or ticker is required.')
+        if not data['remove'] and ('buy_price' not in data or 'shares' not in data):
+            raise serializers.ValidationError('buy_price and shares are required.')
+        return data
+
 class NestedStockSerializer(serializers.ModelSerializer):
     ticker = serializers.CharField(required=True)
     id = serializers.IntegerField(read_only=True)  # fixed source reference
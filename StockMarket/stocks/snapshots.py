@@ -0,0 +1,66 @@
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from stocks.models import Stock, StockPrice, StockSnapshot
+
+# Snapshot field -> days before the latest trading date. The period-ago price is
+# the most recent price on or before that day.
+PERIODS = (
+    ('week_ago', 7),
+    ('month_ago', 30),
+    ('year_ago', 365),
+)
+SNAPSHOT_FIELDS = ('latest',) + tuple(field for field, _ in PERIODS)
+
+# select_related() paths that load a stock's snapshot prices in the same query.
+SNAPSHOT_RELATED = tuple(f'snapshot__{field}' for field in SNAPSHOT_FIELDS)
+
+
+def with_snapshots(queryset):
+    return queryset.select_related(*SNAPSHOT_RELATED)
+
+
+def get_snapshot(stock):
+    try:
+        return stock.snapshot
+    except StockSnapshot.DoesNotExist:
+        return None
+
+
+def rebuild_snapshots(stock_ids=None):
+    """
+    Recompute StockSnapshot rows for the given stock ids (all stocks by default)
+    from a single ordered scan of their prices. Returns the number of rows written.
+    """
+    stocks = Stock.objects.all()
+    prices = StockPrice.objects.order_by('stock_id', 'date')
+    if stock_ids is not None:
+        stocks = stocks.filter(id__in=stock_ids)
+        prices = prices.filter(stock_id__in=stock_ids)
+
+    history = defaultdict(lambda: ([], []))
+    for stock_id, date, price_id in prices.values_list('stock_id', 'date', 'id').iterator(chunk_size=10000):
+        dates, ids = history[stock_id]
+        dates.append(date)
+        ids.append(price_id)
+
+    snapshots = []
+    for stock_id in stocks.values_list('id', flat=True):
+        snapshot = StockSnapshot(stock_id=stock_id)
+        dates, ids = history.get(stock_id, ([], []))
+        if dates:
+            snapshot.latest_id = ids[-1]
+            for field, days in PERIODS:
+                index = bisect_right(dates, dates[-1] - timedelta(days=days))
+                setattr(snapshot, f'{field}_id', ids[index - 1] if index else None)
+        snapshots.append(snapshot)
+
+    with transaction.atomic():
+        StockSnapshot.objects.bulk_create(
+            snapshots,
+            update_conflicts=True,
+            unique_fields=['stock'],
+            update_fields=list(SNAPSHOT_FIELDS),
+        )
+    return len(snapshots)
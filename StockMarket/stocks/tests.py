@@ -1,3 +1,647 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from knox.models import AuthToken
+from rest_framework.test import APIClient
+from stocks.cache import bump_generation
+from stocks.indicators import IndicatorStore, parse_indicators
+from stocks.models import ImportedFile, Portfolio, PortfolioStock, Stock, StockPrice, StockRiskMetrics, StockSnapshot, Watchlist
+from stocks.risk import TRADING_DAYS, rebuild_risk_metrics
+from stocks.screener import Expression, screener_universe
+from stocks.snapshots import rebuild_snapshots
 
-# Create your tests here.
+# Both caches in memory, so tests never touch the file-based market_data cache.
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'market_data': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-market-data'},
+}
+
+PRICE_HEADER = 'Date,Symbol,Series,Prev Close,Open,High,Low,Last,Close,VWAP,Volume\n'
+
+
+def create_stock(ticker, closes, start=date(2024, 1, 1), industry='IT'):
+    """
+    Create a stock with one price row per day from `start`, closing at each
+    of `closes` in turn (the other prices follow from the close).
+    """
+    stock = Stock.objects.create(ticker=ticker, company_name=f'{ticker} Ltd.', series='EQ', industry=industry)
+    add_prices(stock, closes, start)
+    return stock
+
+
+def add_prices(stock, closes, start):
+    previous = None
+    prices = []
+    for day, close in enumerate(closes):
+        close = Decimal(str(close))
+        prices.append(StockPrice(
+            stock=stock, date=start + timedelta(days=day), prev_close_price=previous,
+            open_price=close, high_price=close + 1, low_price=close - 1, last_price=close,
+            close_price=close, VWAP=close, volume=1000 + day,
+        ))
+        previous = close
+    StockPrice.objects.bulk_create(prices)
+
+
+def price_row(ticker, day, close):
+    return f'{day.isoformat()},{ticker},EQ,{close},{close},{close + 1},{close - 1},{close},{close},{close},{1000 + day.day}\n'
+
+
+def stored_prices(ticker):
+    return list(
+        StockPrice.objects.filter(stock__ticker=ticker).order_by('date')
+        .values_list('date', 'prev_close_price', 'open_price', 'high_price', 'low_price',
+                     'last_price', 'close_price', 'VWAP', 'volume')
+    )
+
+
+# Market data tests run against empty in-memory caches, with an authenticated API client.
+@override_settings(CACHES=TEST_CACHES)
+class MarketDataTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        for name in TEST_CACHES:
+            caches[name].clear()
+        self.user = User.objects.create_user('trader')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class DatasetMixin:
+    # A temporary dataset directory, written file by file and imported with import_all_csv.
+
+    def setUp(self):
+        super().setUp()
+        self.dataset = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dataset)
+
+    def write_csv(self, name, text):
+        path = os.path.join(self.dataset, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def write_metadata(self, *tickers):
+        self.write_csv('stock_metadata.csv', 'Company Name,Industry,Symbol,Series,ISIN Code\n' + ''.join(
+            f'{ticker} Ltd.,IT,{ticker},EQ,INE{index:06d}\n' for index, ticker in enumerate(tickers)
+        ))
+
+    def write_prices(self, ticker, start, closes, mode='w'):
+        path = os.path.join(self.dataset, f'{ticker}.csv')
+        with open(path, mode, encoding='utf-8') as f:
+            if mode == 'w':
+                f.write(PRICE_HEADER)
+            for day, close in enumerate(closes):
+                f.write(price_row(ticker, start + timedelta(days=day), close))
+        return path
+
+    def import_dataset(self, *args):
+        out = StringIO()
+        call_command('import_all_csv', self.dataset, *args, stdout=out)
+        return out.getvalue()
+
+
+# import_all_csv: bulk upserts, the two-year window and incremental runs.
+class ImportTests(DatasetMixin, MarketDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write_metadata('AAA', 'BBB')
+        # The 2021 rows fall outside the window of a file ending in 2023 (2022 onwards).
+        self.write_prices('AAA', date(2021, 12, 30), [98, 99])
+        self.write_prices('AAA', date(2023, 1, 1), [100, 101, 102], mode='a')
+        self.write_prices('BBB', date(2024, 3, 1), [50, 51, 52])
+
+    def test_bulk_import(self):
+        output = self.import_dataset()
+        self.assertIn('imported 6 records', output)
+        self.assertEqual(StockPrice.objects.filter(stock__ticker='AAA').count(), 3)
+        self.assertEqual(StockPrice.objects.filter(stock__ticker='BBB').count(), 3)
+        self.assertEqual(stored_prices('AAA')[0][0], date(2023, 1, 1))
+        self.assertEqual(Stock.objects.get(ticker='AAA').last_imported_date, date(2023, 1, 3))
+        self.assertEqual(Stock.objects.get(ticker='BBB').last_imported_date, date(2024, 3, 3))
+        self.assertEqual(ImportedFile.objects.count(), 2)
+        self.assertEqual(StockSnapshot.objects.filter(latest__isnull=False).count(), 2)
+        self.assertTrue(StockRiskMetrics.objects.exists())
+
+        # Re-importing the same files upserts rather than duplicates.
+        self.write_prices('BBB', date(2024, 3, 1), [50, 51, 53])
+        self.import_dataset()
+        self.assertEqual(StockPrice.objects.count(), 6)
+        self.assertEqual(stored_prices('BBB')[-1][6], Decimal('53'))
+
+    def test_incremental_skips_unchanged_files(self):
+        self.import_dataset()
+        output = self.import_dataset('--incremental')
+        self.assertIn('Incremental import: 0 changed files, 2 unchanged files skipped.', output)
+        self.assertIn('imported 0 records', output)
+
+        # A touched file with the same content is recognized by its hash and skipped.
+        path = os.path.join(self.dataset, 'AAA.csv')
+        os.utime(path, (1_000_000_000, 1_000_000_000))
+        output = self.import_dataset('--incremental')
+        self.assertIn('Incremental import: 0 changed files, 2 unchanged files skipped.', output)
+        self.assertEqual(ImportedFile.objects.get(file_name='AAA.csv').mtime, 1_000_000_000)
+
+    def test_incremental_imports_only_new_rows(self):
+        self.import_dataset()
+        url = '/api/stocks/?search=BBB&fields=ticker,latest_price'
+        self.assertEqual(self.client.get(url).json()[0]['latest_price']['date'], '2024-03-03')
+
+        self.write_prices('BBB', date(2024, 3, 4), [54, 55], mode='a')
+        output = self.import_dataset('--incremental')
+        self.assertIn('Incremental import: 1 changed files, 1 unchanged files skipped.', output)
+        self.assertIn('imported 2 records', output)
+        self.assertEqual(StockPrice.objects.filter(stock__ticker='BBB').count(), 5)
+        bbb = Stock.objects.get(ticker='BBB')
+        self.assertEqual(bbb.last_imported_date, date(2024, 3, 5))
+        # The import invalidates the cached listing.
+        self.assertEqual(self.client.get(url).json()[0]['latest_price']['date'], '2024-03-05')
+
+
+# The csv and pandas engines must store the same rows, malformed cells included.
+class EngineParityTests(DatasetMixin, MarketDataTestCase):
+    MALFORMED = PRICE_HEADER + (
+        '2024-01-02,BAD,EQ,"1,234.5",abc,1250.25, 1200 ,,1240.1,1238.1234,"12,345"\n'
+        '2024-01-03,BAD,EQ,1240.1,1241,1260,1239,1255,1256.75,1250.0001,xyz\n'
+        '2024-1-4,BAD,EQ,1256.75,1257,1270,1250,1262,1265,1261.5,20000\n'
+        'bogus,BAD,EQ,1,1,1,1,1,1,1,1\n'
+    )
+
+    def test_malformed_csv_imports_identically(self):
+        self.write_metadata('BAD')
+        self.write_csv('BAD.csv', self.MALFORMED)
+        results = {}
+        for engine in ('csv', 'pandas'):
+            output = self.import_dataset('--engine', engine)
+            self.assertIn('Skipping row with invalid date: bogus', output)
+            results[engine] = stored_prices('BAD')
+            StockPrice.objects.all().delete()
+        self.assertEqual(results['csv'], results['pandas'])
+
+        first, second, third = results['csv']
+        self.assertEqual(str(first[1]), '1234.5000')  # thousands separator
+        self.assertIsNone(first[2])  # "abc"
+        self.assertEqual(str(first[4]), '1200.0000')  # padded cell
+        self.assertEqual(first[8], 12345)
+        self.assertIsNone(second[8])  # "xyz" volume
+        self.assertEqual(str(third[0]), '2024-01-04')  # unpadded date
+
+
+# Stock list, watchlist and portfolio reads take the same number of queries however many stocks they hold.
+class QueryCountTests(MarketDataTestCase):
+    def add_stocks(self, tickers):
+        stocks = [create_stock(ticker, [100, 101, 102, 103]) for ticker in tickers]
+        rebuild_snapshots()
+        rebuild_risk_metrics()
+        watchlist, _ = Watchlist.objects.get_or_create(owner=self.user)
+        watchlist.stocks.add(*stocks)
+        portfolio = Portfolio.objects.filter(owner=self.user).first() or Portfolio.objects.create(
+            owner=self.user, name='Main', description='',
+        )
+        for stock in stocks:
+            PortfolioStock.objects.create(portfolio=portfolio, stock=stock, buy_price=90, shares=10)
+
+    def assertQueriesPerRead(self, url, queries):
+        for tickers in (['AAA', 'BBB'], ['CCC', 'DDD', 'EEE', 'FFF']):
+            self.add_stocks(tickers)
+            caches['default'].clear()
+            with self.assertNumQueries(queries):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_stock_list(self):
+        self.assertQueriesPerRead('/api/stocks/', 2)
+
+    def test_watchlist(self):
+        self.assertQueriesPerRead('/api/watchlist/', 3)
+
+    def test_portfolio_list(self):
+        self.assertQueriesPerRead('/api/portfolios/', 3)
+
+    def test_stocks_without_snapshot(self):
+        # Stocks imported before their snapshot was built fall back to one batched lookup.
+        self.add_stocks(['AAA', 'BBB'])
+        StockSnapshot.objects.all().delete()
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/stocks/?fields=ticker,latest_price')
+        self.assertEqual([stock['latest_price']['close_price'] for stock in response.json()], ['103.0000'] * 2)
+
+
+# Cursor pagination of stocks and prices, and ?fields= projections.
+class PaginationTests(MarketDataTestCase):
+    def setUp(self):
+        super().setUp()
+        for ticker in ('AAA', 'BBB', 'CCC', 'DDD', 'EEE'):
+            create_stock(ticker, [100, 101, 102])
+        rebuild_snapshots()
+
+    def collect(self, url):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.json()['results'])
+            url = response.json()['next']
+        return pages
+
+    def test_plain_list_is_unpaginated(self):
+        response = self.client.get('/api/stocks/?fields=ticker')
+        self.assertEqual(response.json(), [{'ticker': ticker} for ticker in ('AAA', 'BBB', 'CCC', 'DDD', 'EEE')])
+
+    def test_stock_pages(self):
+        pages = self.collect('/api/stocks/?page_size=2&fields=ticker')
+        self.assertEqual([[stock['ticker'] for stock in page] for page in pages], [['AAA', 'BBB'], ['CCC', 'DDD'], ['EEE']])
+
+    def test_price_pages_and_projection(self):
+        pages = self.collect('/api/prices/?stock__ticker=AAA&page_size=2&fields=date,close_price')
+        rows = [row for page in pages for row in page]
+        self.assertEqual(rows, [
+            {'date': '2024-01-03', 'close_price': '102.0000'},
+            {'date': '2024-01-02', 'close_price': '101.0000'},
+            {'date': '2024-01-01', 'close_price': '100.0000'},
+        ])
+
+    def test_nested_price_projection(self):
+        response = self.client.get('/api/stocks/?with_prices=true&fields=ticker,prices.close_price&from=2024-01-03')
+        results = response.json()['results']
+        self.assertEqual(len(results), 5)
+        self.assertEqual(results[0], {'ticker': 'AAA', 'prices': [{'close_price': '102.0000'}]})
+
+
+# ?fields= names a serializer does not have are a 400, even when nothing matches.
+class FieldProjectionTests(MarketDataTestCase):
+    def test_unknown_fields_are_rejected(self):
+        for url, name in [
+            ('/api/stocks/?fields=ticker,bogus', 'bogus'),
+            ('/api/stocks/?with_prices=true&fields=ticker,prices.bogus', 'prices.bogus'),
+            ('/api/prices/?fields=close', 'close'),
+            ('/api/watchlist/?fields=bogus', 'bogus'),
+        ]:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 400, url)
+            self.assertIn(f'Unknown field(s): {name}.', response.json()['fields'])
+            self.assertIn('Allowed: ', response.json()['fields'])
+
+    def test_unused_prefix_is_rejected(self):
+        response = self.client.get('/api/stocks/?fields=prices.date')
+        self.assertEqual(response.status_code, 400)
+
+
+# Cached market data responses, their ETags and invalidation by a new data generation.
+class CacheTests(MarketDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.stock = create_stock('AAA', [100, 101])
+        rebuild_snapshots()
+
+    def test_not_modified(self):
+        response = self.client.get('/api/stocks/')
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/stocks/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        # Another query string is another resource.
+        response = self.client.get('/api/stocks/?fields=ticker', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_generation_bump_invalidates(self):
+        response = self.client.get('/api/stocks/?fields=ticker,company_name')
+        etag = response['ETag']
+        Stock.objects.filter(id=self.stock.id).update(company_name='Renamed Ltd.')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/stocks/?fields=ticker,company_name')
+        self.assertEqual(response.json()[0]['company_name'], 'AAA Ltd.')
+
+        bump_generation()
+        response = self.client.get('/api/stocks/?fields=ticker,company_name', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()[0]['company_name'], 'Renamed Ltd.')
+
+
+# Batched holdings changes and the holdings/<stock_key>/ routes.
+class HoldingsTests(MarketDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.aaa = create_stock('AAA', [100, 110])
+        self.bbb = create_stock('BBB', [50, 55])
+        self.portfolio = Portfolio.objects.create(owner=self.user, name='Main', description='')
+        self.url = f'/api/portfolios/{self.portfolio.id}/holdings/'
+
+    def holdings(self):
+        return list(self.portfolio.portfoliostock_set.order_by('id').values_list('stock__ticker', 'buy_price', 'shares'))
+
+    def test_bulk_changes(self):
+        response = self.client.post(self.url, [
+            {'ticker': 'aaa', 'buy_price': '95', 'shares': '10'},
+            {'id': self.bbb.id, 'buy_price': '45', 'shares': '4'},
+            {'ticker': 'NOPE', 'buy_price': '1', 'shares': '1'},
+            {'ticker': 'AAA', 'remove': True},
+            {'ticker': 'BBB'},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([result['status'] for result in results], ['created', 'created', 'error', 'error', 'error'])
+        self.assertEqual(results[3]['detail'], 'Stock appears more than once in the request.')
+        self.assertEqual(response.json()['counts'], {'created': 2, 'error': 3})
+        self.assertEqual(self.holdings(), [('AAA', Decimal('95'), Decimal('10')), ('BBB', Decimal('45'), Decimal('4'))])
+
+        response = self.client.post(self.url, {'holdings': [
+            {'ticker': 'AAA', 'remove': True},
+            {'ticker': 'BBB', 'buy_price': '46', 'shares': '8'},
+        ]}, format='json')
+        self.assertEqual(response.json()['counts'], {'removed': 1, 'updated': 1})
+        self.assertEqual(self.holdings(), [('BBB', Decimal('46'), Decimal('8'))])
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.json(), [
+            {'id': self.bbb.id, 'ticker': 'BBB', 'buy_price': '46.0000', 'shares': '8.0000', 'current_close': 55.0},
+        ])
+
+    def test_bulk_rejects_empty_body(self):
+        response = self.client.post(self.url, [], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_keyed_holding(self):
+        url = f'{self.url}aaa/'
+        response = self.client.put(url, {'buy_price': '95', 'shares': '10'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {
+            'id': self.aaa.id, 'ticker': 'AAA', 'buy_price': '95.0000', 'shares': '10.0000', 'current_close': 110.0,
+        })
+
+        response = self.client.put(f'{self.url}{self.aaa.id}/', {'buy_price': '96', 'shares': '12'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['shares'], '12.0000')
+
+        response = self.client.patch(url, {'shares': '20'}, format='json')
+        self.assertEqual(response.json()['buy_price'], '96.0000')
+        self.assertEqual(response.json()['shares'], '20.0000')
+
+        response = self.client.put(url, {'shares': '20'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.holdings(), [('AAA', Decimal('96'), Decimal('20'))])
+
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.holdings(), [])
+        self.assertEqual(self.client.delete(url).status_code, 404)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.put(f'{self.url}NOPE/', {'buy_price': '1', 'shares': '1'}, format='json').status_code, 404)
+
+    def test_other_users_portfolio(self):
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('other'))
+        self.assertEqual(other.put(f'{self.url}AAA/', {'buy_price': '1', 'shares': '1'}, format='json').status_code, 404)
+        self.assertEqual(self.holdings(), [])
+
+
+# Watchlist changes through the through table, one stock or many at a time.
+class WatchlistTests(MarketDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.stocks = {ticker: create_stock(ticker, [100]) for ticker in ('AAA', 'BBB', 'CCC')}
+
+    def watched(self):
+        return sorted(Stock.objects.filter(watchlists__owner=self.user).values_list('ticker', flat=True))
+
+    def test_bulk_add_and_remove(self):
+        response = self.client.post('/api/watchlist/bulk/', {'add': ['aaa', self.stocks['BBB'].id, 'NOPE']}, format='json')
+        self.assertEqual(response.json(), {
+            'added': sorted([self.stocks['AAA'].id, self.stocks['BBB'].id]), 'removed': [], 'not_found': ['NOPE'],
+        })
+        self.assertEqual(self.watched(), ['AAA', 'BBB'])
+
+        # Adding a watched stock is a no-op; a stock in both lists is removed.
+        response = self.client.post('/api/watchlist/bulk/', {'add': ['AAA', 'CCC'], 'remove': ['CCC', 'BBB']}, format='json')
+        self.assertEqual(response.json()['added'], [self.stocks['AAA'].id])
+        self.assertEqual(response.json()['removed'], sorted([self.stocks['BBB'].id, self.stocks['CCC'].id]))
+        self.assertEqual(self.watched(), ['AAA'])
+
+        response = self.client.post('/api/watchlist/bulk/', {'add': 'AAA'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_single_add_and_remove(self):
+        stock_id = self.stocks['AAA'].id
+        for _ in range(2):
+            self.assertEqual(self.client.post(f'/api/watchlist/{stock_id}/').status_code, 200)
+        self.assertEqual(self.watched(), ['AAA'])
+        self.assertEqual(self.client.delete(f'/api/watchlist/{stock_id}/').status_code, 200)
+        self.assertEqual(self.watched(), [])
+        self.assertEqual(self.client.post('/api/watchlist/99999/').status_code, 404)
+
+
+# Prices are Decimals in Python and scaled integers in the database.
+class ScaledDecimalFieldTests(TestCase):
+    def test_round_trip(self):
+        stock = Stock.objects.create(ticker='AAA', company_name='AAA Ltd.', series='EQ')
+        values = [Decimal('99999999999.9999'), Decimal('0.0001'), Decimal('-12.5'), Decimal('730.05'), None]
+        for day, value in enumerate(values):
+            StockPrice.objects.create(stock=stock, date=date(2024, 1, 1) + timedelta(days=day), close_price=value)
+        self.assertEqual(list(StockPrice.objects.order_by('date').values_list('close_price', flat=True)), values)
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT close_price FROM stocks_stockprice ORDER BY date')
+            self.assertEqual([row[0] for row in cursor.fetchall()], [999999999999999, 1, -125000, 7300500, None])
+
+        # Lookups are scaled the same way.
+        self.assertEqual(StockPrice.objects.filter(close_price=Decimal('730.05')).count(), 1)
+        self.assertEqual(StockPrice.objects.filter(close_price__gt=Decimal('0.00005')).count(), 3)
+
+    def test_extra_places_round_half_even(self):
+        stock = Stock.objects.create(ticker='AAA', company_name='AAA Ltd.', series='EQ')
+        for day, value in enumerate(['1.00005', '1.00015']):
+            StockPrice.objects.create(stock=stock, date=date(2024, 1, 1) + timedelta(days=day), close_price=Decimal(value))
+        self.assertEqual(
+            list(StockPrice.objects.order_by('date').values_list('close_price', flat=True)),
+            [Decimal('1.0000'), Decimal('1.0002')],
+        )
+
+
+# Indicator series extended with newly imported days match a full recomputation.
+@override_settings(CACHES=TEST_CACHES)
+class IndicatorTests(TestCase):
+    CLOSES = [100 + 10 * np.sin(day / 3) + day / 4 for day in range(60)]
+
+    def setUp(self):
+        for name in TEST_CACHES:
+            caches[name].clear()
+        self.stock = create_stock('AAA', [round(close, 2) for close in self.CLOSES[:40]])
+        self.specs = parse_indicators('sma:5,ema:10,rsi:14,bollinger:20:2,vwap:5')
+
+    def assertColumnsEqual(self, computed, expected):
+        self.assertEqual(computed.keys(), expected.keys())
+        for name in expected:
+            np.testing.assert_allclose(computed[name], expected[name], rtol=1e-9, equal_nan=True, err_msg=name)
+
+    def test_extend_matches_full_recompute(self):
+        store = IndicatorStore()
+        store.compute([self.stock.id], self.specs)
+        series = store.series[self.stock.id]
+
+        # Two imports, so the second extension continues from the state of the first.
+        for start in (40, 50):
+            closes = [round(close, 2) for close in self.CLOSES[start:start + 10]]
+            add_prices(self.stock, closes, date(2024, 1, 1) + timedelta(days=start))
+            bump_generation()
+            dates, _, columns = store.compute([self.stock.id], self.specs)[self.stock.id]
+            self.assertIs(store.series[self.stock.id], series)  # extended, not reloaded
+        self.assertEqual(len(dates), 60)
+
+        full_dates, _, full_columns = IndicatorStore().compute([self.stock.id], self.specs)[self.stock.id]
+        np.testing.assert_array_equal(dates, full_dates)
+        self.assertColumnsEqual(columns, full_columns)
+
+    def test_rewritten_history_reloads(self):
+        store = IndicatorStore()
+        store.compute([self.stock.id], self.specs)
+        series = store.series[self.stock.id]
+
+        StockPrice.objects.filter(stock=self.stock, date=date(2024, 1, 5)).update(close_price=Decimal('1'))
+        add_prices(self.stock, [150], date(2024, 2, 10))
+        bump_generation()
+        _, _, columns = store.compute([self.stock.id], self.specs)[self.stock.id]
+        self.assertIsNot(store.series[self.stock.id], series)
+        _, _, full_columns = IndicatorStore().compute([self.stock.id], self.specs)[self.stock.id]
+        self.assertColumnsEqual(columns, full_columns)
+
+
+# Screener expressions are evaluated from a whitelist of syntax, never executed.
+class ScreenerTests(MarketDataTestCase):
+    def setUp(self):
+        super().setUp()
+        create_stock('AAA', [100, 110], industry='IT')
+        create_stock('BBB', [100, 90], industry='BANK')
+        rebuild_snapshots()
+
+    def test_rejects_code(self):
+        columns = screener_universe().columns
+        for text in [
+            "__import__('os').system('true')",
+            'ticker.lower() == "aaa"',
+            'close.real > 0',
+            '().__class__',
+            '(lambda: 1)()',
+            'close[0] > 1',
+            'open("x")',
+        ]:
+            with self.assertRaises(ValueError, msg=text):
+                Expression(text).evaluate(columns)
+
+        response = self.client.get('/api/stocks/screen/', {'where': "__import__('os').getcwd()"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Unsupported expression', response.json()['detail'])
+
+    def test_screen(self):
+        response = self.client.get('/api/stocks/screen/', {'where': "close > 95 and industry in ('IT', 'X')", 'sort': '-close'})
+        self.assertEqual(response.json()['count'], 1)
+        self.assertEqual(response.json()['results'][0]['ticker'], 'AAA')
+        self.assertEqual(response.json()['results'][0]['close'], 110.0)
+
+
+# Correlation and backtest results against values worked out by hand.
+class CorrelationBacktestTests(MarketDataTestCase):
+    # Daily returns: AAA +10%, 0%, -10%; BBB +10%, +10%, 0%.
+    def setUp(self):
+        super().setUp()
+        create_stock('AAA', [100, 110, 110, 99], start=date(2024, 1, 29))
+        create_stock('BBB', [200, 220, 242, 242], start=date(2024, 1, 29))
+
+    def test_correlation(self):
+        response = self.client.get('/api/stocks/correlation/', {'tickers': 'AAA,BBB,NOPE', 'window': 'all'})
+        data = response.json()
+        self.assertEqual(data['tickers'], ['AAA', 'BBB'])
+        self.assertEqual(data['excluded'], ['NOPE'])
+        self.assertEqual((data['observations'], data['start'], data['end']), (3, '2024-01-30', '2024-02-01'))
+        # Sample variances 0.01 and 1/300, covariance 0.005: correlation sqrt(3)/2.
+        covariance = np.array(data['covariance']) / TRADING_DAYS
+        np.testing.assert_allclose(covariance, [[0.01, 0.005], [0.005, 1 / 300]])
+        np.testing.assert_allclose(data['correlation'], [[1, np.sqrt(3) / 2], [np.sqrt(3) / 2, 1]])
+        self.assertAlmostEqual(data['average_correlation'], np.sqrt(3) / 2)
+
+    def test_buy_and_hold(self):
+        response = self.client.get('/api/stocks/backtest/', {'weights': 'AAA:1,BBB:1', 'capital': '100'})
+        data = response.json()
+        # 50 in each: 50 * (1, 1.1, 1.1, 0.99) + 50 * (1, 1.1, 1.21, 1.21).
+        np.testing.assert_allclose(data['series']['equity'], [100, 110, 115.5, 110])
+        np.testing.assert_allclose(data['series']['returns'][1:], [0.1, 0.05, 110 / 115.5 - 1])
+        self.assertEqual(data['weights'], {'AAA': 0.5, 'BBB': 0.5})
+        self.assertEqual(data['rebalances'], 0)
+        self.assertAlmostEqual(data['twr'], 0.1)
+        self.assertAlmostEqual(data['cagr'], 1.1 ** (365.25 / 3) - 1)
+
+    def test_monthly_rebalance(self):
+        response = self.client.get('/api/stocks/backtest/', {'weights': 'AAA,BBB', 'capital': '100', 'rebalance': 'monthly'})
+        data = response.json()
+        # Back to 57.75 each at the January 31 close; February 1: 57.75 * 0.9 + 57.75 * 1.
+        self.assertEqual(data['rebalances'], 1)
+        np.testing.assert_allclose(data['series']['equity'], [100, 110, 115.5, 109.725])
+        self.assertAlmostEqual(data['twr'], 0.09725)
+
+    def test_portfolio_shares(self):
+        portfolio = Portfolio.objects.create(owner=self.user, name='Main', description='')
+        for ticker, shares in (('AAA', 3), ('BBB', 1)):
+            PortfolioStock.objects.create(portfolio=portfolio, stock=Stock.objects.get(ticker=ticker), buy_price=1, shares=shares)
+        data = self.client.get(f'/api/portfolios/{portfolio.id}/backtest/').json()
+        # 3 * AAA + 1 * BBB held throughout.
+        np.testing.assert_allclose(data['series']['equity'], [500, 550, 572, 539])
+        self.assertEqual(data['weights'], {'AAA': 0.6, 'BBB': 0.4})
+
+
+# The async read endpoints answer exactly as their sync counterparts.
+class AsyncParityTests(MarketDataTestCase):
+    def setUp(self):
+        super().setUp()
+        self.stock = create_stock('AAA', [100 + day for day in range(30)])
+        create_stock('BBB', [50 + day for day in range(30)], industry='BANK')
+        rebuild_snapshots()
+        rebuild_risk_metrics()
+        Watchlist.objects.create(owner=self.user).stocks.add(self.stock)
+        _, self.token = AuthToken.objects.create(self.user)
+
+    def test_same_responses(self):
+        pairs = [
+            ('/api/stocks/', '/api/async/stocks/'),
+            ('/api/stocks/?search=aa&fields=ticker,latest_price', '/api/async/stocks/?search=aa&fields=ticker,latest_price'),
+            ('/api/stocks/?industry=BANK', '/api/async/stocks/?industry=BANK'),
+            (f'/api/stocks/{self.stock.id}/', f'/api/async/stocks/{self.stock.id}/'),
+            ('/api/stocks/99999/', '/api/async/stocks/99999/'),
+            ('/api/stocks/?fields=bogus', '/api/async/stocks/?fields=bogus'),
+            ('/api/stocks/AAA/ohlcv/?from=2024-01-10&points=5', '/api/async/stocks/AAA/ohlcv/?from=2024-01-10&points=5'),
+            ('/api/stocks/AAA/ohlcv/?format=bin', '/api/async/stocks/AAA/ohlcv/?format=bin'),
+            ('/api/stocks/AAA/ohlcv/?points=1', '/api/async/stocks/AAA/ohlcv/?points=1'),
+            ('/api/watchlist/', '/api/async/watchlist/'),
+        ]
+        sync = APIClient()
+        sync.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        expected = [sync.get(url, HTTP_ACCEPT='*/*' if 'bin' in url else 'application/json') for url, _ in pairs]
+
+        async def fetch():
+            return [
+                await self.async_client.get(url, headers={'Authorization': f'Token {self.token}'})
+                for _, url in pairs
+            ]
+
+        for (url, _), want, got in zip(pairs, expected, async_to_sync(fetch)()):
+            self.assertEqual(got.status_code, want.status_code, url)
+            self.assertEqual(got['Content-Type'], want['Content-Type'], url)
+            self.assertEqual(got.content, want.content, url)
+
+    def test_requires_token(self):
+        async def fetch():
+            return await self.async_client.get('/api/async/stocks/')
+
+        response = async_to_sync(fetch)()
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
@@ -0,0 +1,165 @@
+from datetime import date
+import numpy as np
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models import CharField
+from django.db.models.functions import Cast
+from stocks.fields import ScaledDecimalField
+
+# Columnar access to price history. Rows are fetched with a raw cursor from the
+# SQL the ORM generates, so no model instances or per-value Decimal objects are
+# built, and are turned into NumPy column arrays in one pass.
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Dates are selected as ISO text: the backend's per-value date converter is
+# skipped and NumPy parses the strings in one call (see to_date_array).
+DATE_TEXT = Cast('date', output_field=CharField())
+
+OHLCV_FIELDS = (
+    ('open', 'open_price'),
+    ('high', 'high_price'),
+    ('low', 'low_price'),
+    ('close', 'close_price'),
+)
+
+
+def fetch_columns(queryset, fields):
+    """
+    Run queryset.values_list(*fields) through a raw cursor and return one tuple
+    of raw database values per field (empty tuples when there are no rows).
+    """
+    try:
+        sql, params = queryset.values_list(*fields).query.sql_with_params()
+    except EmptyResultSet:
+        # e.g. .none() or filter(id__in=[]), which the ORM answers without a query.
+        return [()] * len(fields)
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    if not rows:
+        return [()] * len(fields)
+    return list(zip(*rows))
+
+
+def to_float_array(values):
+    # NULL (None) becomes NaN; Decimal values from other backends convert too.
+    return np.array(values, dtype=np.float64)
+
+
+def to_field_array(model, name, values):
+    # Raw values of a model field as float64. Scaled-integer fields are divided
+    # back into units, since the raw cursor bypasses the field's from_db_value().
+    array = to_float_array(values)
+    field = model._meta.get_field(name)
+    if isinstance(field, ScaledDecimalField):
+        array /= field.scale
+    return array
+
+
+def to_date_array(values):
+    # Date objects go through their ordinals, which is far faster than letting
+    # NumPy convert each object; backends returning ISO strings parse directly.
+    if len(values) and isinstance(values[0], date):
+        ordinals = np.fromiter(map(date.toordinal, values), np.int64, len(values))
+        return (ordinals - EPOCH_ORDINAL).astype('datetime64[D]')
+    return np.array(values, dtype='datetime64[D]')
+
+
+def load_ohlcv(prices):
+    """
+    Load an OHLCV series from a StockPrice queryset, oldest first.
+
+    Returns a dict of arrays: dates (datetime64[D]), open/high/low/close
+    (float64, NaN when missing) and volume (int64, -1 when missing).
+    """
+    columns = fetch_columns(
+        prices.order_by('date'),
+        [DATE_TEXT] + [field for _, field in OHLCV_FIELDS] + ['volume'],
+    )
+    series = {'dates': to_date_array(columns[0])}
+    for (name, field), values in zip(OHLCV_FIELDS, columns[1:]):
+        series[name] = to_field_array(prices.model, field, values)
+    volume = to_float_array(columns[-1])
+    series['volume'] = np.where(np.isnan(volume), -1, volume).astype(np.int64)
+    return series
+
+
+def downsample_ohlcv(series, points):
+    """
+    Aggregate a series into at most `points` bars of consecutive rows: first
+    date and open, highest high, lowest low, last close and summed volume.
+    """
+    count = len(series['dates'])
+    if points >= count:
+        return series
+    starts = np.unique(np.linspace(0, count, points, endpoint=False).astype(np.int64))
+    ends = np.append(starts[1:], count) - 1
+    volume = series['volume']
+    known = np.where(volume < 0, 0, volume)
+    return {
+        'dates': series['dates'][starts],
+        'open': series['open'][starts],
+        'high': np.fmax.reduceat(series['high'], starts),
+        'low': np.fmin.reduceat(series['low'], starts),
+        'close': series['close'][ends],
+        'volume': np.add.reduceat(known, starts),
+    }
+
+
+def series_to_json(series):
+    # Column lists for JSON; NaN is not valid JSON, so missing values become null.
+    data = {'dates': np.datetime_as_string(series['dates'], unit='D').tolist()}
+    for name, _ in OHLCV_FIELDS:
+        values = series[name]
+        missing = np.isnan(values)
+        data[name] = values.tolist()
+        if missing.any():
+            data[name] = [None if gap else value for value, gap in zip(data[name], missing.tolist())]
+    data['volume'] = series['volume'].tolist()
+    if (series['volume'] < 0).any():
+        data['volume'] = [None if value < 0 else value for value in data['volume']]
+    return data
+
+
+def load_close_matrix(prices, field='close_price', key='stock__ticker'):
+    """
+    Pivot a StockPrice queryset into a wide matrix with one query.
+
+    Returns (dates, keys, matrix): sorted datetime64[D] dates, the sorted
+    distinct values of `key` (tickers by default), and a float64 array of shape
+    (len(dates), len(keys)) holding `field`, NaN where a key has no row for a date.
+    """
+    # Row order is irrelevant here, so skip the model's default ORDER BY.
+    date_values, key_values, values = fetch_columns(prices.order_by(), [DATE_TEXT, key, field])
+    if not date_values:
+        return np.array([], dtype='datetime64[D]'), [], np.empty((0, 0))
+    dates, date_index = np.unique(to_date_array(date_values), return_inverse=True)
+    keys, key_index = np.unique(np.array(key_values), return_inverse=True)
+    matrix = np.full((len(dates), len(keys)), np.nan)
+    matrix[date_index, key_index] = to_field_array(prices.model, field, values)
+    return dates, keys.tolist(), matrix
+
+
+def last_valid_dates(dates, matrix):
+    # Date of the last non-NaN value in each column (NaT for empty columns).
+    found = ~np.isnan(matrix)
+    last = matrix.shape[0] - 1 - np.argmax(found[::-1], axis=0)
+    return np.where(found.any(axis=0), dates[last], np.datetime64('NaT'))
+
+
+def forward_fill(matrix):
+    # Carry the last known value down each column; leading gaps stay NaN.
+    rows = np.arange(matrix.shape[0])[:, None]
+    last = np.where(np.isnan(matrix), 0, rows)
+    np.maximum.accumulate(last, axis=0, out=last)
+    return matrix[last, np.arange(matrix.shape[1])]
+
+
+def daily_returns(matrix):
+    # Simple return of each row against the ticker's previous known value, so a
+    # ticker missing from some dates gets the same returns as its own series;
+    # rows where the ticker has no value are NaN.
+    previous = forward_fill(matrix)[:-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return matrix[1:] / previous - 1
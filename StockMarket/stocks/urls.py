@@ -1,16 +1,26 @@
 from rest_framework.routers import DefaultRouter
-from .api import StockViewSet, PortfolioViewSet
+from .api import StockViewSet, StockPriceViewSet, PortfolioViewSet
 from django.urls import path
-from stocks.api import get_watchlist, change_watchlist
+from stocks.api import get_watchlist, get_watchlist_correlation, change_watchlist, bulk_change_watchlist, get_industries
+from stocks import async_api
 
 urlpatterns = [
+    path('api/industries/', get_industries, name='get_industries'),
     path('api/watchlist/', get_watchlist, name='get_watchlist'),
+    path('api/watchlist/bulk/', bulk_change_watchlist, name='bulk_change_watchlist'),
+    path('api/watchlist/correlation/', get_watchlist_correlation, name='get_watchlist_correlation'),
     path('api/watchlist/<int:stock_id>', change_watchlist, name='change_watchlist'),  # Use POST to add
     path('api/watchlist/<int:stock_id>/', change_watchlist, name='change_watchlist'),
+    # Async versions of the hot read endpoints, for ASGI deployments (see stocks/async_api.py).
+    path('api/async/stocks/', async_api.stock_list, name='async_stock_list'),
+    path('api/async/stocks/<int:pk>/', async_api.stock_detail, name='async_stock_detail'),
+    path('api/async/stocks/<str:ticker>/ohlcv/', async_api.stock_ohlcv, name='async_stock_ohlcv'),
+    path('api/async/watchlist/', async_api.watchlist, name='async_watchlist'),
 ]
 
 router = DefaultRouter()
 router.register('api/stocks', StockViewSet, basename='stock')
+router.register('api/prices', StockPriceViewSet, basename='price')
 router.register('api/portfolios', PortfolioViewSet, basename='portfolio')
 # router.register('api/watchlists', WatchlistViewSet, basename='watchlist')
 